@@ -9,8 +9,18 @@ https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 
 import os
 
+from asgiref.sync import ThreadSensitiveContext
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gcse_programming_project.settings')
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "gcse_programming_project.settings")
+os.environ.setdefault("DJANGO_ASGI", "1")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+
+async def application(scope, receive, send):
+    # Django 3.2 runs the synchronous code (views, ORM queries) of every request
+    # in one shared thread. Giving each request its own context runs it in a
+    # thread of its own, so slow requests don't hold up the others.
+    async with ThreadSensitiveContext():
+        await django_application(scope, receive, send)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -52,21 +53,22 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
+    "profit_calculator.instrumentation.RequestMetricsMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
-    "profit_calculator.middleware.LoginRequiredMiddleware",
-    "profit_calculator.middleware.FlightplanCookieRequiredMiddleware",
+    "profit_calculator.middleware.CurrentFlightplanMiddleware",
+    "profit_calculator.middleware.AccessPolicyMiddleware",
 ]
 
 ROOT_URLCONF = "gcse_programming_project.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "BACKEND": "profit_calculator.instrumentation.InstrumentedDjangoTemplates",
         "DIRS": [],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -87,25 +89,94 @@ WSGI_APPLICATION = "gcse_programming_project.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
+# Persistent connections are reused by the threads of a WSGI server. Under ASGI
+# every request runs in a new thread, so they would only be left open.
+DATABASE_CONN_MAX_AGE = 0 if os.environ.get("DJANGO_ASGI") else 600
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
-    }
+        "CONN_MAX_AGE": DATABASE_CONN_MAX_AGE,
+    },
+    # Second connection to the same file, used by views that only read
+    "read": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / "db.sqlite3",
+        "CONN_MAX_AGE": DATABASE_CONN_MAX_AGE,
+        "TEST": {"MIRROR": "default"},
+    },
 }
 
+DATABASE_ROUTERS = ["profit_calculator.db.ReadWriteRouter"]
+
+READ_DATABASE = "read"
+
+# Applied to every SQLite connection when it is opened
+
+SQLITE_PRAGMAS = {
+    "journal_mode": "wal",
+    "synchronous": "normal",
+    "busy_timeout": 20000,  # ms
+    "cache_size": -32000,  # KiB
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "memory",
+}
+
+# Caches
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # Kept on disk so that every server process on this machine shares it
+    "shared": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.environ.get("DJANGO_CACHE_DIR", BASE_DIR / "cache"),
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
+}
+
+# Sessions
+# https://docs.djangoproject.com/en/3.2/topics/http/sessions/
+
+# Sessions are read from the shared cache and written through to the database,
+# so they survive the cache being cleared. Use
+# "django.contrib.sessions.backends.cache" to keep them only in the cache, or
+# "django.contrib.sessions.backends.db" to not cache them.
+SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
+SESSION_CACHE_ALIAS = "shared"
+
+# Whether the current flight plan is complete, shown in the navbar of every page
+
+NAVBAR_CACHE_ALIAS = "shared"
+NAVBAR_CACHE_TIMEOUT = 60 * 60
+
+# Seconds that rendered parts of pages are cached for. They are cached under the
+# flight plan's version, so they never need to be cleared.
+
+FRAGMENT_CACHE_TIMEOUT = 60 * 60
+
 # Authentication
 # https://docs.djangoproject.com/en/3.2/topics/auth/default/
 
 LOGIN_URL = "profit_calculator:login"
 LOGIN_REDIRECT_URL = "profit_calculator:index"
 LOGOUT_REDIRECT_URL = "profit_calculator:login"
-OPEN_URLS = [
-    "profit_calculator:signup",
-    "profit_calculator:logout",
-    "profit_calculator:change_password",
+
+# The pooled hasher uses the same format as PBKDF2PasswordHasher (which is
+# left out as it would take over checking passwords in that format).
+PASSWORD_HASHERS = [
+    "profit_calculator.hashers.PooledPBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
 ]
 
+# Number of passwords that can be hashed at once
+PASSWORD_HASHING_WORKERS = 2
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -170,3 +241,44 @@ CRISPY_TEMPLATE_PACK = "bootstrap5"
 # Custom template settings
 
 NAVBAR_BREAKPOINT = "xl"
+
+# UK airports that flights can depart from. Routes from these to every foreign
+# airport are worked out on import - run `manage.py buildroutes` after adding one.
+
+ORIGIN_AIRPORTS = {
+    "LPL": {
+        "name": "Liverpool John Lennon Airport",
+        "latitude": 53.3336,
+        "longitude": -2.8497,
+    },
+    "BOH": {
+        "name": "Bournemouth International Airport",
+        "latitude": 50.78,
+        "longitude": -1.8425,
+    },
+}
+
+# Recalculation of flight plans after airport/aircraft data changes
+
+PROPAGATE_IN_BACKGROUND = True
+PROPAGATION_CHUNK_SIZE = 500
+
+# In-memory airport/aircraft cache (seconds between checks for changes)
+
+REFERENCE_DATA_CHECK_INTERVAL = 1
+
+# Number of airports in each page of search results on the airport form
+
+AIRPORT_SEARCH_PAGE_SIZE = 20
+
+# Largest batch accepted by the profit calculation API
+
+PROFIT_CALCULATION_MAX_SCENARIOS = 10000
+
+# Largest file accepted when importing flight plans (bytes)
+
+FLIGHTPLAN_IMPORT_MAX_SIZE = 2 * 1024 * 1024
+
+# Seconds that price sensitivity results are cached for
+
+SENSITIVITY_CACHE_TIMEOUT = 60 * 60
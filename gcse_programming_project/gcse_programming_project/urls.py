@@ -13,18 +13,24 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+
 from django.contrib import admin
 from django.templatetags.static import static
 from django.urls import include, path
 from django.views.generic.base import RedirectView
 
+from profit_calculator.access import public
+
 urlpatterns = [
-    path(
-        "favicon.ico",
-        RedirectView.as_view(
-            url=static("profit_calculator/img/favicon.ico"), permanent=True
-        ),
+    public(
+        path(
+            "favicon.ico",
+            RedirectView.as_view(
+                url=static("profit_calculator/img/favicon.ico"), permanent=True
+            ),
+        )
     ),
     path("", include("profit_calculator.urls")),
-    path("admin/", admin.site.urls),
+    # The admin site checks permissions itself
+    public(path("admin/", admin.site.urls)),
 ]
@@ -0,0 +1,77 @@
+"""Access requirements declared on URL patterns.
+
+Each pattern in ``urls.py`` is wrapped in ``public``, ``requires_login`` or
+``requires_flightplan``. ``compile_access_policies`` turns those declarations
+into frozen lookup tables once, so ``AccessPolicyMiddleware`` only needs a
+dictionary lookup per request. Wrapping an ``include()`` applies the requirement
+to every URL under it, and URLs with no requirement need the user to log in.
+"""
+
+from types import MappingProxyType
+
+from django.core.exceptions import ImproperlyConfigured
+from django.urls import URLResolver, get_resolver
+from django.urls.resolvers import RoutePattern
+
+PUBLIC = "public"
+LOGIN = "login"
+FLIGHTPLAN = "flightplan"
+
+DEFAULT_POLICY = LOGIN
+
+
+def _declare(policy, pattern):
+    pattern.access_policy = policy
+    return pattern
+
+
+def public(pattern):
+    """Anyone can access the URL."""
+    return _declare(PUBLIC, pattern)
+
+
+def requires_login(pattern):
+    """Only logged in users can access the URL."""
+    return _declare(LOGIN, pattern)
+
+
+def requires_flightplan(pattern):
+    """Only logged in users with a current flight plan can access the URL."""
+    return _declare(FLIGHTPLAN, pattern)
+
+
+def _route(pattern, prefix):
+    if not isinstance(pattern.pattern, RoutePattern) or pattern.pattern.converters:
+        raise ImproperlyConfigured(
+            f"Can't declare an access policy for {pattern.pattern} - only path() "
+            f"routes without parameters are supported."
+        )
+    return prefix + str(pattern.pattern)
+
+
+def _walk(patterns, prefix, paths, prefixes):
+    for pattern in patterns:
+        policy = getattr(pattern, "access_policy", None)
+        if isinstance(pattern, URLResolver):
+            if policy is None:
+                _walk(
+                    pattern.url_patterns, prefix + str(pattern.pattern), paths, prefixes
+                )
+                continue
+            route = _route(pattern, prefix)
+            if route.count("/") != 2:
+                raise ImproperlyConfigured(
+                    f"Access policies can only be declared for includes at a single "
+                    f"path segment, not {route}"
+                )
+            prefixes[route] = policy
+        elif policy is not None:
+            paths[_route(pattern, prefix)] = policy
+
+
+def compile_access_policies(urlconf=None):
+    """Frozen mappings from paths, and from first path segments, to policies."""
+    paths = {}
+    prefixes = {}
+    _walk(get_resolver(urlconf).url_patterns, "/", paths, prefixes)
+    return MappingProxyType(paths), MappingProxyType(prefixes)
@@ -1,5 +1,8 @@
 from django.contrib import admin
+from django.db.models import F
 
+from . import reference
+from .feasibility import rebuild_feasibility
 from .models import (
     Aircraft,
     AircraftPlan,
@@ -7,22 +10,58 @@ from .models import (
     AirportPlan,
     FlightPlan,
     PricingPlan,
+    Route,
 )
+from .propagation import propagate_deletion, schedule_propagation
 
 admin.site.site_header = "Flight profitability calculator administration"
 admin.site.site_title = "Flight plan administration"
 
 
+class RouteInline(admin.TabularInline):
+    model = Route
+    extra = 0
+
+
 @admin.register(Airport)
 class AirportAdmin(admin.ModelAdmin):
     fieldsets = (
         ("Name", {"fields": ("code", "name")}),
-        ("Location", {"fields": ("distance_from_lpl", "distance_from_boh")}),
+        ("Location", {"fields": ("latitude", "longitude")}),
     )
+    inlines = (RouteInline,)
     list_display = ("code", "name")
     ordering = ("name",)
     search_fields = ("code", "name")
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        reference.airports.invalidate()
+        if change and "name" in form.changed_data:
+            # The name is shown on flight plan pages, which are cached by version.
+            schedule_propagation(airports=[obj.pk])
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        if any(formset.has_changed() for formset in formsets):
+            reference.routes.invalidate()
+            rebuild_feasibility(airports=[form.instance.pk])
+            if change:
+                schedule_propagation(airports=[form.instance.pk])
+
+    def delete_model(self, request, obj):
+        with propagate_deletion(airports=[obj.pk], background=True):
+            super().delete_model(request, obj)
+        reference.airports.invalidate()
+        reference.routes.invalidate()
+
+    def delete_queryset(self, request, queryset):
+        airports = list(queryset.values_list("pk", flat=True))
+        with propagate_deletion(airports=airports, background=True):
+            super().delete_queryset(request, queryset)
+        reference.airports.invalidate()
+        reference.routes.invalidate()
+
 
 @admin.register(Aircraft)
 class AircraftAdmin(admin.ModelAdmin):
@@ -37,11 +76,71 @@ class AircraftAdmin(admin.ModelAdmin):
     ordering = ("pk",)
     search_fields = ("type",)
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        reference.aircraft.invalidate()
+        if not change or form.changed_data:
+            rebuild_feasibility(aircraft=[obj.pk])
+        if change and {"running_cost", "range", "max_standard_class"} & set(
+            form.changed_data
+        ):
+            schedule_propagation(aircraft=[obj.pk])
+
+    def delete_model(self, request, obj):
+        with propagate_deletion(aircraft=[obj.pk], background=True):
+            super().delete_model(request, obj)
+        reference.aircraft.invalidate()
+
+    def delete_queryset(self, request, queryset):
+        aircraft = list(queryset.values_list("pk", flat=True))
+        with propagate_deletion(aircraft=aircraft, background=True):
+            super().delete_queryset(request, queryset)
+        reference.aircraft.invalidate()
+
 
 @admin.register(FlightPlan)
 class FlightPlanAdmin(admin.ModelAdmin):
-    list_display = ("id", "save_name", "created", "user", "complete")
+    list_display = (
+        "id",
+        "save_name",
+        "created",
+        "user",
+        "route",
+        "aircraft",
+        "profit",
+        "margin",
+        "is_complete",
+    )
     list_display_links = ("save_name",)
+    list_filter = (
+        "is_complete",
+        "airport_plan__uk_airport",
+        "aircraft_plan__aircraft",
+    )
+    list_select_related = ("user",)
     ordering = ("-created", "save_name")
-    search_fields = ("save_name",)
+    search_fields = ("save_name", "airport_plan__foreign_airport__code")
     fields = ("save_name", "user", "created")
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_summary()
+
+    @admin.display(ordering="uk_airport")
+    def route(self, obj):
+        if obj.uk_airport and obj.foreign_airport:
+            return f"{obj.uk_airport} → {obj.foreign_airport}"
+        return None
+
+    @admin.display(ordering="aircraft")
+    def aircraft(self, obj):
+        return obj.aircraft
+
+    @admin.display(ordering=F("profit").desc(nulls_last=True))
+    def profit(self, obj):
+        return obj.profit if obj.is_complete else None
+
+    @admin.display(description="margin (%)", ordering=F("margin").desc(nulls_last=True))
+    def margin(self, obj):
+        if obj.is_complete and obj.margin is not None:
+            return round(obj.margin, 1)
+        return None
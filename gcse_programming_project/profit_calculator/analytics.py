@@ -0,0 +1,166 @@
+"""Profit of every route and aircraft across all users' flight plans.
+
+The totals are kept in the ``RouteSummary`` table. Whenever a flight plan is
+recalculated, its previous figures are taken away from the row it was counted
+in and its new figures are added to the row for its current route and aircraft.
+Only complete flight plans are counted.
+"""
+
+from decimal import Decimal
+
+from django.apps import apps
+from django.db import IntegrityError, transaction
+from django.db.models import ExpressionWrapper, F, FloatField, Sum
+from django.db.models.functions import NullIf
+
+from .calculations import TWO_PLACES
+
+VALUE_FIELDS = ["profit", "income", "standard_class_price", "first_class_price"]
+TOTAL_FIELDS = ["total_" + field for field in VALUE_FIELDS]
+
+
+def get_route_summary_model():
+    return apps.get_model("profit_calculator", "RouteSummary")
+
+
+def get_values(pricing_plan, previous=False):
+    """The figures a pricing plan adds to the summary (now or when it was loaded)."""
+    if previous:
+        values = [pricing_plan.get_previous_value(field) for field in VALUE_FIELDS]
+    else:
+        values = [getattr(pricing_plan, field) for field in VALUE_FIELDS]
+    # Values are stored to two decimal places, so they're counted that way too.
+    return [
+        value.quantize(TWO_PLACES) if value is not None else Decimal(0)
+        for value in values
+    ]
+
+
+def get_summary_key(flightplan):
+    return get_route_summary_model().get_key(
+        flightplan.airport_plan.uk_airport,
+        flightplan.airport_plan.foreign_airport_id,
+        flightplan.aircraft_plan.aircraft_id,
+    )
+
+
+class SummaryChanges:
+    """Changes to the route summary, written together by ``apply()``."""
+
+    def __init__(self):
+        self.deltas = {}
+        self.new_rows = {}
+
+    def add(self, key, values, count=1):
+        delta = self.deltas.setdefault(key, [0] + [Decimal(0)] * len(VALUE_FIELDS))
+        delta[0] += count
+        for i, value in enumerate(values, start=1):
+            delta[i] += value * count
+
+    def move(self, flightplan, pricing_plan, complete):
+        """Move a flight plan's figures to the row for its current route.
+
+        ``flightplan.route_summary_id`` is set to the new row (or None if the
+        flight plan isn't complete), but isn't saved.
+        """
+        old_key = flightplan.route_summary_id
+        new_key = get_summary_key(flightplan) if complete else None
+        if old_key is not None:
+            self.add(old_key, get_values(pricing_plan, previous=True), count=-1)
+        if new_key is not None:
+            self.add(new_key, get_values(pricing_plan))
+            if new_key not in self.new_rows:
+                self.new_rows[new_key] = flightplan
+        flightplan.route_summary_id = new_key
+
+    def apply(self):
+        RouteSummary = get_route_summary_model()
+        for key, (count, *totals) in self.deltas.items():
+            if not count and not any(totals):
+                continue
+            changes = {
+                field: F(field) + total for field, total in zip(TOTAL_FIELDS, totals)
+            }
+            updated = RouteSummary.objects.filter(key=key).update(
+                num_flightplans=F("num_flightplans") + count, **changes
+            )
+            if not updated and key in self.new_rows:
+                flightplan = self.new_rows[key]
+                try:
+                    with transaction.atomic():
+                        RouteSummary.objects.create(
+                            key=key,
+                            origin=flightplan.airport_plan.uk_airport,
+                            destination_id=flightplan.airport_plan.foreign_airport_id,
+                            aircraft_id=flightplan.aircraft_plan.aircraft_id,
+                            num_flightplans=count,
+                            **dict(zip(TOTAL_FIELDS, totals)),
+                        )
+                except IntegrityError:
+                    # Another process created the row first.
+                    RouteSummary.objects.filter(key=key).update(
+                        num_flightplans=F("num_flightplans") + count, **changes
+                    )
+        self.deltas = {}
+        self.new_rows = {}
+
+
+def remove_deleted_flightplan(sender, instance, **kwargs):
+    """Take a deleted flight plan's figures out of the summary."""
+    if instance.route_summary_id is None:
+        return
+    PricingPlan = apps.get_model("profit_calculator", "PricingPlan")
+    values = (
+        PricingPlan.objects.filter(pk=instance.pricing_plan_id)
+        .values_list(*VALUE_FIELDS)
+        .first()
+    )
+    if values is not None:
+        changes = SummaryChanges()
+        changes.add(
+            instance.route_summary_id,
+            [value if value is not None else Decimal(0) for value in values],
+            count=-1,
+        )
+        changes.apply()
+
+
+def get_totals(queryset):
+    """Annotate grouped route summary rows with their totals and averages."""
+    num_flightplans = Sum("num_flightplans")
+    return queryset.annotate(
+        num_flightplans_total=num_flightplans,
+        average_profit=ExpressionWrapper(
+            Sum("total_profit") / num_flightplans, output_field=FloatField()
+        ),
+        margin=ExpressionWrapper(
+            Sum("total_profit") * 100.0 / NullIf(Sum("total_income"), 0),
+            output_field=FloatField(),
+        ),
+        average_standard_class_price=ExpressionWrapper(
+            Sum("total_standard_class_price") / num_flightplans,
+            output_field=FloatField(),
+        ),
+        average_first_class_price=ExpressionWrapper(
+            Sum("total_first_class_price") / num_flightplans,
+            output_field=FloatField(),
+        ),
+    )
+
+
+def get_route_totals():
+    """Totals for each route (over every aircraft) with at least one flight plan."""
+    return get_totals(
+        get_route_summary_model()
+        .objects.filter(num_flightplans__gt=0)
+        .values("origin", "destination", "destination__name")
+    )
+
+
+def get_aircraft_totals():
+    """Totals for each aircraft (over every route) with at least one flight plan."""
+    return get_totals(
+        get_route_summary_model()
+        .objects.filter(num_flightplans__gt=0)
+        .values("aircraft")
+    )
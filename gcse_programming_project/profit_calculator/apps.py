@@ -1,6 +1,19 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete
 
 
 class ProfitCalculatorConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'profit_calculator'
+
+    def ready(self):
+        from .analytics import remove_deleted_flightplan
+        from .db import configure_sqlite
+        from .instrumentation import install_query_timer
+
+        connection_created.connect(configure_sqlite)
+        connection_created.connect(install_query_timer)
+        post_delete.connect(
+            remove_deleted_flightplan, sender="profit_calculator.FlightPlan"
+        )
@@ -0,0 +1,290 @@
+import math
+from decimal import Decimal
+
+TWO_PLACES = Decimal("0.01")
+EARTH_RADIUS = 6371  # km
+
+
+def calculate_cost_per_seat(running_cost, distance):
+    return running_cost * Decimal(distance / 100)
+
+
+def calculate_num_standard_class(max_standard_class, num_first_class):
+    return max_standard_class - num_first_class * 2
+
+
+def calculate_break_even_price(cost_per_seat, max_standard_class, num_first_class):
+    """Standard class price that breaks even on a full flight.
+
+    First class seats are assumed to cost twice the standard class price, which
+    makes the income the price multiplied by ``max_standard_class``.
+    """
+    if not max_standard_class:
+        return None
+    num_seats = num_first_class + calculate_num_standard_class(
+        max_standard_class, num_first_class
+    )
+    return cost_per_seat * num_seats / max_standard_class
+
+
+def calculate_profit(
+    cost_per_seat,
+    num_first_class,
+    num_standard_class,
+    first_class_price,
+    standard_class_price,
+):
+    """Return (running cost, income, profit) for a single configuration."""
+    running_cost = cost_per_seat * (num_first_class + num_standard_class)
+    income = (
+        num_first_class * first_class_price + num_standard_class * standard_class_price
+    )
+    return running_cost, income, income - running_cost
+
+
+def first_class_range(aircraft):
+    """Every valid number of first class seats for an aircraft.
+
+    Each first class seat takes the space of two standard class seats, so at most
+    half of ``max_standard_class`` can be first class seats.
+    """
+    return range(aircraft.min_first_class, aircraft.max_standard_class // 2 + 1)
+
+
+def price_range(start, stop, step):
+    """Inclusive range of Decimal prices from start to stop."""
+    prices = []
+    price = start
+    while price <= stop:
+        prices.append(price)
+        price += step
+    return prices
+
+
+def profit_surface(
+    cost_per_seat, max_standard_class, first_class_counts, standard_prices, first_prices
+):
+    """Evaluate the profit for every combination of seats and prices in one pass.
+
+    The profit is separable into a term that only depends on the number of seats,
+    a term that only depends on the standard class price and one that only depends
+    on the first class price, so each term is computed once per axis and the
+    surface is built by summing them (``surface[seats][standard][first]``).
+    """
+    surface = []
+    for num_first_class in first_class_counts:
+        num_standard_class = calculate_num_standard_class(
+            max_standard_class, num_first_class
+        )
+        running_cost = cost_per_seat * (num_first_class + num_standard_class)
+        standard_income = [num_standard_class * price for price in standard_prices]
+        first_income = [num_first_class * price for price in first_prices]
+        surface.append(
+            [
+                [standard + first - running_cost for first in first_income]
+                for standard in standard_income
+            ]
+        )
+    return surface
+
+
+def optimise_flightplan(
+    aircraft, distance, standard_prices, first_prices, include_surface=False
+):
+    """Find the most profitable seat and price configuration for an aircraft/route.
+
+    Returns a dict describing the best configuration along with the axes. The
+    best profit is tracked while sweeping every combination, so the profit
+    surface is only built (to be plotted) if ``include_surface`` is true.
+    """
+    cost_per_seat = calculate_cost_per_seat(aircraft.running_cost, distance)
+    first_class_counts = list(first_class_range(aircraft))
+    best = None
+    for i, num_first_class in enumerate(first_class_counts):
+        num_standard_class = calculate_num_standard_class(
+            aircraft.max_standard_class, num_first_class
+        )
+        running_cost = cost_per_seat * (num_first_class + num_standard_class)
+        first_income = [num_first_class * price for price in first_prices]
+        for j, price in enumerate(standard_prices):
+            standard_income = num_standard_class * price - running_cost
+            for k, income in enumerate(first_income):
+                profit = standard_income + income
+                if best is None or profit > best[0]:
+                    best = (profit, i, j, k)
+    if best is None:
+        return None
+    _, i, j, k = best
+    num_first_class = first_class_counts[i]
+    num_standard_class = calculate_num_standard_class(
+        aircraft.max_standard_class, num_first_class
+    )
+    running_cost, income, profit = calculate_profit(
+        cost_per_seat,
+        num_first_class,
+        num_standard_class,
+        first_prices[k],
+        standard_prices[j],
+    )
+    result = {
+        "best": {
+            "num_first_class": num_first_class,
+            "num_standard_class": num_standard_class,
+            "standard_class_price": standard_prices[j].quantize(TWO_PLACES),
+            "first_class_price": first_prices[k].quantize(TWO_PLACES),
+            "cost_per_seat": cost_per_seat.quantize(TWO_PLACES),
+            "running_cost": running_cost.quantize(TWO_PLACES),
+            "income": income.quantize(TWO_PLACES),
+            "profit": profit.quantize(TWO_PLACES),
+        },
+        "num_first_class": first_class_counts,
+        "standard_class_prices": standard_prices,
+        "first_class_prices": first_prices,
+    }
+    if include_surface:
+        surface = profit_surface(
+            cost_per_seat,
+            aircraft.max_standard_class,
+            first_class_counts,
+            standard_prices,
+            first_prices,
+        )
+        result["profit"] = [
+            [[profit.quantize(TWO_PLACES) for profit in row] for row in rows]
+            for rows in surface
+        ]
+    return result
+
+
+def rank_aircraft(aircraft, distance, standard_class_price, first_class_price):
+    """The best seat configuration of every aircraft that can fly a route.
+
+    Every number of first class seats is evaluated for each aircraft in range in
+    one pass with ``profit_surface``. The aircraft are ranked by the highest
+    profit they can make at the given prices, most profitable first.
+    """
+    ranking = []
+    for plane in aircraft:
+        first_class_counts = list(first_class_range(plane))
+        if plane.range <= distance or not first_class_counts:
+            continue
+        cost_per_seat = calculate_cost_per_seat(plane.running_cost, distance)
+        surface = profit_surface(
+            cost_per_seat,
+            plane.max_standard_class,
+            first_class_counts,
+            [standard_class_price],
+            [first_class_price],
+        )
+        best = max(range(len(surface)), key=lambda i: surface[i][0][0])
+        num_first_class = first_class_counts[best]
+        num_standard_class = calculate_num_standard_class(
+            plane.max_standard_class, num_first_class
+        )
+        running_cost, income, profit = calculate_profit(
+            cost_per_seat,
+            num_first_class,
+            num_standard_class,
+            first_class_price,
+            standard_class_price,
+        )
+        ranking.append(
+            {
+                "aircraft": plane.type,
+                "num_first_class": num_first_class,
+                "num_standard_class": num_standard_class,
+                "cost_per_seat": cost_per_seat.quantize(TWO_PLACES),
+                "running_cost": running_cost.quantize(TWO_PLACES),
+                "income": income.quantize(TWO_PLACES),
+                "profit": profit.quantize(TWO_PLACES),
+            }
+        )
+    ranking.sort(key=lambda result: result["profit"], reverse=True)
+    return ranking
+
+
+def sensitivity_surface(
+    cost_per_seat,
+    num_first_class,
+    num_standard_class,
+    standard_prices,
+    first_prices,
+    running_cost_factors=(Decimal(1),),
+):
+    """Profit of a seat configuration for every combination of prices.
+
+    The running cost is multiplied by each of ``running_cost_factors`` to show
+    how sensitive the profit is to it. As with ``profit_surface``, each term of
+    the profit is only computed once per axis (``surface[factor][standard][first]``).
+    """
+    running_cost = cost_per_seat * (num_first_class + num_standard_class)
+    standard_income = [num_standard_class * price for price in standard_prices]
+    first_income = [num_first_class * price for price in first_prices]
+    return [
+        [
+            [standard + first - running_cost * factor for first in first_income]
+            for standard in standard_income
+        ]
+        for factor in running_cost_factors
+    ]
+
+
+def break_even_contour(
+    running_cost, num_first_class, num_standard_class, standard_prices, first_prices
+):
+    """Points along the line of zero profit within the range of prices given.
+
+    Profit is linear in both prices, so the contour is a straight line. It is
+    given as (standard class price, first class price) pairs, one for each
+    standard class price (or each first class price if there is no first class).
+    """
+    points = []
+    if num_first_class:
+        for standard_price in standard_prices:
+            first_price = (
+                running_cost - num_standard_class * standard_price
+            ) / num_first_class
+            if first_prices[0] <= first_price <= first_prices[-1]:
+                points.append((standard_price, first_price.quantize(TWO_PLACES)))
+    elif num_standard_class:
+        standard_price = running_cost / num_standard_class
+        if standard_prices[0] <= standard_price <= standard_prices[-1]:
+            points = [
+                (standard_price.quantize(TWO_PLACES), first_price)
+                for first_price in first_prices
+            ]
+    return points
+
+
+def great_circle_distances(origins, destinations):
+    """Distances in km between every origin and destination.
+
+    Both arguments are sequences of (latitude, longitude) pairs in degrees. The
+    trigonometry for each point is only worked out once, and the result is a
+    list with one row of distances per destination.
+    """
+
+    def prepare(points):
+        return [
+            (math.radians(latitude), math.radians(longitude))
+            for latitude, longitude in points
+        ]
+
+    origins = [
+        (latitude, longitude, math.cos(latitude))
+        for latitude, longitude in prepare(origins)
+    ]
+    distances = []
+    for latitude, longitude in prepare(destinations):
+        cos_latitude = math.cos(latitude)
+        row = []
+        for origin_latitude, origin_longitude, cos_origin_latitude in origins:
+            a = (
+                math.sin((latitude - origin_latitude) / 2) ** 2
+                + cos_origin_latitude
+                * cos_latitude
+                * math.sin((longitude - origin_longitude) / 2) ** 2
+            )
+            row.append(round(2 * EARTH_RADIUS * math.asin(math.sqrt(a))))
+        distances.append(row)
+    return distances
@@ -0,0 +1,55 @@
+"""SQLite tuning and routing of read-only requests to a separate connection.
+
+Every connection to an SQLite database has ``SQLITE_PRAGMAS`` applied when it is
+opened. With the write-ahead log, readers don't block the writer (or the other
+way round), so the views that only read run on the ``READ_DATABASE`` connection
+and don't queue up behind the sessions and flight plans being written on the
+default one.
+"""
+
+import contextvars
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_read_only = contextvars.ContextVar("read_only", default=False)
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """Apply the pragmas to every new SQLite connection."""
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for pragma, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {pragma} = {value}")
+        if connection.alias == settings.READ_DATABASE:
+            cursor.execute("PRAGMA query_only = ON")
+
+
+@contextmanager
+def read_only_database():
+    """Send every query made inside the block to the read database."""
+    token = _read_only.set(True)
+    try:
+        yield
+    finally:
+        _read_only.reset(token)
+
+
+class ReadWriteRouter:
+    def db_for_read(self, model, **hints):
+        if _read_only.get() and settings.READ_DATABASE in connections:
+            return settings.READ_DATABASE
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Objects read from the read database are still saved to the default one.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases are connections to the same database.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != settings.READ_DATABASE
@@ -0,0 +1,152 @@
+"""Streaming export of flight plans with their airport, aircraft and pricing data.
+
+Each writer is a generator that yields the file piece by piece while the flight
+plans are read from the database in chunks, so memory use doesn't depend on
+the number of flight plans being exported.
+"""
+
+import csv
+import io
+import json
+from datetime import datetime
+from decimal import Decimal
+
+import yaml
+from django.utils.xmlutils import SimplerXMLGenerator
+
+CHUNK_SIZE = 500
+
+AIRPORT_PLAN_FIELDS = ["uk_airport", "foreign_airport", "distance"]
+AIRCRAFT_PLAN_FIELDS = ["aircraft", "num_first_class", "num_standard_class"]
+PRICING_PLAN_FIELDS = [
+    "standard_class_price",
+    "first_class_price",
+    "cost_per_seat",
+    "running_cost",
+    "income",
+    "profit",
+]
+SUB_PLANS = {
+    "airport_plan": AIRPORT_PLAN_FIELDS,
+    "aircraft_plan": AIRCRAFT_PLAN_FIELDS,
+    "pricing_plan": PRICING_PLAN_FIELDS,
+}
+FLIGHT_PLAN_FIELDS = ["save_name", "created", "complete"]
+CSV_FIELDS = FLIGHT_PLAN_FIELDS + [
+    field for fields in SUB_PLANS.values() for field in fields
+]
+
+CONTENT_TYPES = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "xml": "application/xml",
+    "yaml": "application/yaml",
+    "csv": "text/csv",
+}
+
+
+def _value(value):
+    """Convert a field value to a type that every format can represent."""
+    if isinstance(value, Decimal):
+        return str(value)
+    elif isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def flightplan_to_dict(fp):
+    data = {
+        "save_name": fp.save_name,
+        "created": _value(fp.created),
+        "complete": fp.is_complete,
+    }
+    for name, fields in SUB_PLANS.items():
+        plan = getattr(fp, name)
+        data[name] = {
+            field: _value(getattr(plan, plan._meta.get_field(field).attname))
+            for field in fields
+        }
+    return data
+
+
+def iterate_flightplans(queryset):
+    return queryset.select_related(
+        "airport_plan", "aircraft_plan", "pricing_plan"
+    ).iterator(chunk_size=CHUNK_SIZE)
+
+
+def write_json(queryset):
+    yield "["
+    separator = ""
+    for fp in iterate_flightplans(queryset):
+        yield separator + json.dumps(flightplan_to_dict(fp))
+        separator = ","
+    yield "]"
+
+
+def write_ndjson(queryset):
+    for fp in iterate_flightplans(queryset):
+        yield json.dumps(flightplan_to_dict(fp)) + "\n"
+
+
+def write_yaml(queryset):
+    empty = True
+    for fp in iterate_flightplans(queryset):
+        empty = False
+        yield yaml.safe_dump([flightplan_to_dict(fp)], sort_keys=False)
+    if empty:
+        yield "[]\n"
+
+
+def _xml_fields(xml, data):
+    for field, value in data.items():
+        if isinstance(value, dict):
+            xml.startElement(field, {})
+            _xml_fields(xml, value)
+            xml.endElement(field)
+        elif value is None:
+            xml.addQuickElement(field, attrs={"null": "true"})
+        else:
+            xml.addQuickElement(field, str(value))
+
+
+def write_xml(queryset):
+    stream = io.StringIO()
+    xml = SimplerXMLGenerator(stream, "utf-8")
+    xml.startDocument()
+    xml.startElement("flightplans", {})
+    for fp in iterate_flightplans(queryset):
+        xml.startElement("flightplan", {})
+        _xml_fields(xml, flightplan_to_dict(fp))
+        xml.endElement("flightplan")
+        yield stream.getvalue()
+        stream.seek(0)
+        stream.truncate()
+    xml.endElement("flightplans")
+    xml.endDocument()
+    yield stream.getvalue()
+
+
+def write_csv(queryset):
+    stream = io.StringIO()
+    writer = csv.DictWriter(stream, fieldnames=CSV_FIELDS)
+    writer.writeheader()
+    for fp in iterate_flightplans(queryset):
+        data = flightplan_to_dict(fp)
+        row = {field: data[field] for field in FLIGHT_PLAN_FIELDS}
+        for name in SUB_PLANS:
+            row.update(data[name])
+        writer.writerow(row)
+        yield stream.getvalue()
+        stream.seek(0)
+        stream.truncate()
+    yield stream.getvalue()
+
+
+WRITERS = {
+    "json": write_json,
+    "ndjson": write_ndjson,
+    "xml": write_xml,
+    "yaml": write_yaml,
+    "csv": write_csv,
+}
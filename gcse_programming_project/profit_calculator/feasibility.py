@@ -0,0 +1,128 @@
+"""Precomputed range feasibility and costs of every route and aircraft pair.
+
+``RouteFeasibility`` holds one row for each combination of route and aircraft,
+so the forms and reports can find out which aircraft can fly a route with one
+indexed query instead of working it out for every airport and aircraft. The
+rows are rebuilt in bulk whenever routes or aircraft change.
+"""
+
+from django.db import connection, transaction
+
+from .calculations import (
+    TWO_PLACES,
+    calculate_break_even_price,
+    calculate_cost_per_seat,
+)
+from .models import Aircraft, Route, RouteFeasibility
+
+BATCH_SIZE = 1000
+
+FIELDS = [
+    "origin",
+    "destination",
+    "aircraft",
+    "distance",
+    "in_range",
+    "cost_per_seat",
+    "break_even_price",
+]
+
+
+def get_feasibility(route, aircraft):
+    """Row of values (in the order of ``FIELDS``) for an aircraft on a route.
+
+    ``route`` is an (origin, destination, distance) tuple.
+    """
+    origin, destination, distance = route
+    cost_per_seat = calculate_cost_per_seat(aircraft.running_cost, distance)
+    break_even_price = calculate_break_even_price(
+        cost_per_seat, aircraft.max_standard_class, aircraft.min_first_class
+    )
+    return (
+        origin,
+        destination,
+        aircraft.pk,
+        distance,
+        aircraft.range > distance,
+        cost_per_seat.quantize(TWO_PLACES),
+        break_even_price.quantize(TWO_PLACES) if break_even_price is not None else None,
+    )
+
+
+def _insert(rows):
+    """Insert rows of values with a single ``executemany``.
+
+    The table can have hundreds of thousands of rows, and building a model
+    instance for each of them makes ``bulk_create`` several times slower.
+    """
+    if not rows:
+        return
+    opts = RouteFeasibility._meta
+    columns = ", ".join(
+        connection.ops.quote_name(opts.get_field(field).column) for field in FIELDS
+    )
+    placeholders = ", ".join(["%s"] * len(FIELDS))
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {connection.ops.quote_name(opts.db_table)} "
+            f"({columns}) VALUES ({placeholders})",
+            rows,
+        )
+
+
+def _batched(items, size):
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+def rebuild_feasibility(airports=None, aircraft=None, batch_size=BATCH_SIZE):
+    """Rebuild the rows for the given airport codes and aircraft types.
+
+    With neither given, the whole table is rebuilt. Returns the number of rows
+    written.
+    """
+    all_aircraft = list(Aircraft.objects.all())
+    if airports is None and aircraft is None:
+        deletes = [RouteFeasibility.objects.all()]
+        pairs = [(Route.objects.all(), all_aircraft)]
+    else:
+        airports = list(airports or [])
+        aircraft = set(aircraft or [])
+        deletes = [
+            RouteFeasibility.objects.filter(destination__in=batch)
+            for batch in _batched(airports, batch_size)
+        ] + [
+            RouteFeasibility.objects.filter(aircraft__in=batch)
+            for batch in _batched(list(aircraft), batch_size)
+        ]
+        # Every route needs a row for each changed aircraft, and the routes to
+        # each changed airport need one for every other aircraft.
+        pairs = [
+            (Route.objects.all(), [obj for obj in all_aircraft if obj.pk in aircraft])
+        ] + [
+            (
+                Route.objects.filter(destination__in=batch),
+                [obj for obj in all_aircraft if obj.pk not in aircraft],
+            )
+            for batch in _batched(airports, batch_size)
+        ]
+
+    total = 0
+    with transaction.atomic():
+        for queryset in deletes:
+            queryset.delete()
+        for routes, aircraft_list in pairs:
+            if not aircraft_list:
+                continue
+            rows = []
+            for route in routes.values_list(
+                "origin", "destination", "distance"
+            ).iterator():
+                rows += [get_feasibility(route, obj) for obj in aircraft_list]
+                if len(rows) >= batch_size:
+                    _insert(rows)
+                    total += len(rows)
+                    rows = []
+            _insert(rows)
+            total += len(rows)
+    return total
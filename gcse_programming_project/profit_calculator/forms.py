@@ -0,0 +1,280 @@
+from decimal import Decimal
+
+from django import forms
+from django.conf import settings
+from django.core.exceptions import ValidationError
+
+from . import reference
+from .calculations import (
+    TWO_PLACES,
+    calculate_cost_per_seat,
+    calculate_num_standard_class,
+    calculate_profit,
+    first_class_range,
+    price_range,
+)
+from .models import AircraftPlan, AirportPlan, PricingPlan
+
+
+class ReferenceChoiceField(forms.ModelChoiceField):
+    """Model choice field that looks choices up in the reference data cache."""
+
+    def __init__(self, cache, **kwargs):
+        self.cache = cache
+        super().__init__(queryset=cache.model.objects.all(), **kwargs)
+
+    def __deepcopy__(self, memo):
+        # The queryset is only iterated (never cached) when rendering the choices,
+        # so copies of the field can share it instead of cloning it for every form.
+        result = super(forms.ChoiceField, self).__deepcopy__(memo)
+        result.queryset = self.queryset
+        return result
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        # Values from JSON or YAML can be lists or dicts, which can't be keys.
+        obj = self.cache.get(value) if isinstance(value, (str, int)) else None
+        if obj is None:
+            raise ValidationError(
+                self.error_messages["invalid_choice"],
+                code="invalid_choice",
+                params={"value": value},
+            )
+        return obj
+
+
+class AirportPlanForm(forms.ModelForm):
+    uk_airport = forms.ChoiceField(label="UK airport")
+    foreign_airport = ReferenceChoiceField(reference.airports)
+
+    class Meta:
+        model = AirportPlan
+        fields = ["uk_airport", "foreign_airport"]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["uk_airport"].choices = get_uk_airport_choices()
+
+    def clean(self):
+        cleaned_data = super().clean()
+        uk_airport = cleaned_data.get("uk_airport")
+        foreign_airport = cleaned_data.get("foreign_airport")
+        if (
+            uk_airport
+            and foreign_airport
+            and reference.routes.get((uk_airport, foreign_airport.pk)) is None
+        ):
+            raise ValidationError(
+                "There is no route between the selected airports.", code="invalid"
+            )
+        return cleaned_data
+
+
+class AircraftPlanForm(forms.ModelForm):
+    aircraft = ReferenceChoiceField(reference.aircraft)
+
+    class Meta:
+        model = AircraftPlan
+        fields = ["aircraft", "num_first_class"]
+
+
+def get_uk_airport_choices():
+    return [
+        (code, airport["name"]) for code, airport in settings.ORIGIN_AIRPORTS.items()
+    ]
+
+
+class RouteForm(forms.Form):
+    """A UK airport and a foreign airport that there is a route between."""
+
+    uk_airport = forms.ChoiceField(choices=get_uk_airport_choices)
+    foreign_airport = ReferenceChoiceField(reference.airports)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        uk_airport = cleaned_data.get("uk_airport")
+        foreign_airport = cleaned_data.get("foreign_airport")
+        if uk_airport and foreign_airport:
+            route = reference.routes.get((uk_airport, foreign_airport.pk))
+            if route is None:
+                raise ValidationError(
+                    "There is no route between the selected airports.", code="invalid"
+                )
+            cleaned_data["distance"] = route.distance
+        return cleaned_data
+
+
+class ProfitScenarioForm(RouteForm):
+    """One route, aircraft and pricing combination to work out the profit of."""
+
+    aircraft = ReferenceChoiceField(reference.aircraft)
+    num_first_class = forms.IntegerField(min_value=0)
+    standard_class_price = forms.DecimalField(
+        max_digits=7, decimal_places=2, min_value=0
+    )
+    first_class_price = forms.DecimalField(max_digits=7, decimal_places=2, min_value=0)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        aircraft = cleaned_data.get("aircraft")
+        num_first_class = cleaned_data.get("num_first_class")
+        if aircraft and num_first_class is not None:
+            seats = first_class_range(aircraft)
+            if num_first_class not in seats:
+                raise ValidationError(
+                    {
+                        "num_first_class": "The number of first class seats must be "
+                        f"between {seats.start} and {seats.stop - 1}"
+                    },
+                    code="invalid",
+                )
+        return cleaned_data
+
+    def calculate(self):
+        """The profit of the scenario, as a dict that can be serialised to JSON."""
+        aircraft = self.cleaned_data["aircraft"]
+        distance = self.cleaned_data["distance"]
+        num_first_class = self.cleaned_data["num_first_class"]
+        num_standard_class = calculate_num_standard_class(
+            aircraft.max_standard_class, num_first_class
+        )
+        cost_per_seat = calculate_cost_per_seat(aircraft.running_cost, distance)
+        running_cost, income, profit = calculate_profit(
+            cost_per_seat,
+            num_first_class,
+            num_standard_class,
+            self.cleaned_data["first_class_price"],
+            self.cleaned_data["standard_class_price"],
+        )
+        return {
+            "distance": distance,
+            "in_range": aircraft.range > distance,
+            "num_standard_class": num_standard_class,
+            "cost_per_seat": cost_per_seat.quantize(TWO_PLACES),
+            "running_cost": running_cost.quantize(TWO_PLACES),
+            "income": income.quantize(TWO_PLACES),
+            "profit": profit.quantize(TWO_PLACES),
+        }
+
+
+class FlightPlanImportForm(ProfitScenarioForm):
+    """One flight plan read from an export file, where any detail can be missing."""
+
+    save_name = forms.CharField(max_length=100)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for name in ProfitScenarioForm.base_fields:
+            self.fields[name].required = False
+
+
+class PriceGridForm(forms.Form):
+    """A grid of standard and first class prices to evaluate the profit over.
+
+    ``layers`` is the number of times the grid is evaluated (e.g. once for each
+    number of first class seats), which counts towards the ``max_cells`` limit.
+    """
+
+    max_cells = 500_000
+
+    standard_class_min = forms.DecimalField(max_digits=7, decimal_places=2, min_value=0)
+    standard_class_max = forms.DecimalField(max_digits=7, decimal_places=2, min_value=0)
+    standard_class_step = forms.DecimalField(
+        max_digits=7, decimal_places=2, min_value=Decimal("0.01")
+    )
+    first_class_min = forms.DecimalField(max_digits=7, decimal_places=2, min_value=0)
+    first_class_max = forms.DecimalField(max_digits=7, decimal_places=2, min_value=0)
+    first_class_step = forms.DecimalField(
+        max_digits=7, decimal_places=2, min_value=Decimal("0.01")
+    )
+
+    def __init__(self, *args, layers=1, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.layers = layers
+
+    def get_layers(self):
+        return self.layers
+
+    def clean(self):
+        cleaned_data = super().clean()
+        cells = self.get_layers()
+        for prefix in ["standard_class", "first_class"]:
+            start = cleaned_data.get(f"{prefix}_min")
+            stop = cleaned_data.get(f"{prefix}_max")
+            step = cleaned_data.get(f"{prefix}_step")
+            if start is None or stop is None or step is None:
+                cells = None
+                continue
+            if start > stop:
+                raise ValidationError(
+                    f"The minimum {prefix.replace('_', ' ')} price must not be "
+                    f"larger than the maximum.",
+                    code="invalid",
+                )
+            if cells is not None:
+                cells *= (stop - start) // step + 1
+        if cells is not None and cells > self.max_cells:
+            raise ValidationError(
+                f"Too many combinations of prices - there must be at most "
+                f"{self.max_cells} in total.",
+                code="invalid",
+            )
+        return cleaned_data
+
+    def get_prices(self, prefix):
+        """The prices in the grid, to the decimal places they are saved with."""
+        field = PricingPlan._meta.get_field(f"{prefix}_price")
+        places = Decimal(10) ** -field.decimal_places
+        return [
+            price.quantize(places)
+            for price in price_range(
+                self.cleaned_data[f"{prefix}_min"],
+                self.cleaned_data[f"{prefix}_max"],
+                self.cleaned_data[f"{prefix}_step"],
+            )
+        ]
+
+    def standard_class_prices(self):
+        return self.get_prices("standard_class")
+
+    def first_class_prices(self):
+        return self.get_prices("first_class")
+
+
+class OptimiseForm(PriceGridForm):
+    surface = forms.BooleanField(
+        required=False,
+        help_text="Also return the profit of every combination of seats and prices",
+    )
+
+
+class SensitivityForm(PriceGridForm):
+    running_cost_variation = forms.DecimalField(
+        max_digits=5,
+        decimal_places=2,
+        min_value=0,
+        max_value=100,
+        required=False,
+        help_text="Percentage above and below the running cost to also evaluate",
+    )
+
+    @staticmethod
+    def get_default_data(pricing_plan):
+        """Price ranges from zero to double the plan's current prices."""
+        data = {}
+        for prefix in ["standard_class", "first_class"]:
+            price = getattr(pricing_plan, f"{prefix}_price")
+            data[f"{prefix}_min"] = "0.00"
+            data[f"{prefix}_max"] = price * 2
+            data[f"{prefix}_step"] = max(price / 10, TWO_PLACES).quantize(TWO_PLACES)
+        return data
+
+    def get_layers(self):
+        return self.layers * len(self.running_cost_factors())
+
+    def running_cost_factors(self):
+        variation = self.cleaned_data.get("running_cost_variation")
+        if not variation:
+            return [Decimal(1)]
+        return [1 - variation / 100, Decimal(1), 1 + variation / 100]
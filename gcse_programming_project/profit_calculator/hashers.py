@@ -0,0 +1,24 @@
+"""Password hashing on a bounded pool of threads.
+
+Hashing a password takes a deliberately large amount of CPU time. Under ASGI
+each request's synchronous code runs in its own thread, so a burst of logins or
+signups would otherwise hash as many passwords at once as there are requests.
+Running the hashing on a fixed number of workers bounds that, leaving CPU time
+for the other requests.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASHING_WORKERS, thread_name_prefix="hashing"
+)
+
+
+class PooledPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """``PBKDF2PasswordHasher`` that hashes on the pool, with the same format."""
+
+    def encode(self, password, salt, iterations=None):
+        return _executor.submit(super().encode, password, salt, iterations).result()
@@ -0,0 +1,143 @@
+"""Import of flight plans from files written by the exports module.
+
+Every flight plan in the file is checked against the current airport, aircraft
+and route data before anything is saved. The figures worked out from them (the
+distance, seats, costs and profit) are recalculated rather than read from the
+file, so a file exported before the reference data changed is brought up to
+date. XML files can't be imported as there is no safe XML parser installed.
+"""
+
+import csv
+import json
+
+import yaml
+
+from .exports import FLIGHT_PLAN_FIELDS, SUB_PLANS
+from .forms import FlightPlanImportForm
+from .models import AircraftPlan, AirportPlan, FlightPlan, PricingPlan
+
+MAX_ERRORS = 20
+
+EXTENSIONS = {
+    ".json": "json",
+    ".ndjson": "ndjson",
+    ".yaml": "yaml",
+    ".yml": "yaml",
+    ".csv": "csv",
+}
+
+
+class FlightPlanImportError(Exception):
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__("\n".join(errors))
+
+
+def read_json(file):
+    return json.load(file)
+
+
+def read_ndjson(file):
+    return [json.loads(line) for line in file if line.strip()]
+
+
+def read_yaml(file):
+    return yaml.safe_load(file) or []
+
+
+def read_csv(file):
+    records = []
+    for row in csv.DictReader(file):
+        record = {field: row.get(field) for field in FLIGHT_PLAN_FIELDS}
+        for name, fields in SUB_PLANS.items():
+            record[name] = {field: row.get(field) or None for field in fields}
+        records.append(record)
+    return records
+
+
+READERS = {
+    "json": read_json,
+    "ndjson": read_ndjson,
+    "yaml": read_yaml,
+    "csv": read_csv,
+}
+
+
+def read_flightplans(file, filetype):
+    """Read the flight plan records from an open text file."""
+    try:
+        records = READERS[filetype](file)
+    except (ValueError, yaml.YAMLError, csv.Error) as e:
+        raise FlightPlanImportError([f"The file could not be read: {e}"])
+    if not isinstance(records, list) or not all(
+        isinstance(record, dict) for record in records
+    ):
+        raise FlightPlanImportError(["The file must contain a list of flight plans."])
+    return records
+
+
+def get_form_data(record):
+    """Flatten a record's sub-plans into the fields of ``FlightPlanImportForm``."""
+    data = {"save_name": record.get("save_name")}
+    for name in SUB_PLANS:
+        plan = record.get(name) or {}
+        if not isinstance(plan, dict):
+            return None
+        data.update(plan)
+    return data
+
+
+def build_flightplan(user, cleaned_data):
+    """An unsaved flight plan, with unsaved sub-plans, for validated data."""
+    airport_plan = AirportPlan(
+        uk_airport=cleaned_data["uk_airport"],
+        foreign_airport=cleaned_data["foreign_airport"],
+    )
+    airport_plan.update_distance()
+    aircraft_plan = AircraftPlan(
+        aircraft=cleaned_data["aircraft"],
+        num_first_class=cleaned_data["num_first_class"],
+    )
+    aircraft_plan.update_num_standard_class()
+    pricing_plan = PricingPlan(
+        standard_class_price=cleaned_data["standard_class_price"],
+        first_class_price=cleaned_data["first_class_price"],
+    )
+    fp = FlightPlan(
+        save_name=cleaned_data["save_name"],
+        user=user,
+        airport_plan=airport_plan,
+        aircraft_plan=aircraft_plan,
+        pricing_plan=pricing_plan,
+    )
+    fp.is_complete = pricing_plan.calculate()
+    return fp
+
+
+def build_flightplans(user, records):
+    """Validate every record, returning the flight plans to create for ``user``.
+
+    Raises ``FlightPlanImportError`` with the first ``MAX_ERRORS`` problems if
+    any record is invalid, so that either all of the file is imported or none.
+    """
+    flightplans = []
+    errors = []
+    for number, record in enumerate(records, start=1):
+        data = get_form_data(record)
+        if data is None:
+            errors.append(f"Flight plan {number}: invalid airport, aircraft or prices.")
+            continue
+        form = FlightPlanImportForm(data)
+        if form.is_valid():
+            flightplans.append(build_flightplan(user, form.cleaned_data))
+        else:
+            for field, messages in form.errors.items():
+                prefix = "" if field == "__all__" else f"{field}: "
+                errors += [
+                    f"Flight plan {number}: {prefix}{message}" for message in messages
+                ]
+        if len(errors) >= MAX_ERRORS:
+            break
+    if errors:
+        raise FlightPlanImportError(errors[:MAX_ERRORS])
+    return flightplans
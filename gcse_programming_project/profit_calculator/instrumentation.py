@@ -0,0 +1,221 @@
+"""Per-view timing and query counts.
+
+``RequestMetricsMiddleware`` measures each request's wall time, the number and
+total time of its SQL queries, and the time spent rendering templates (through
+the ``InstrumentedDjangoTemplates`` backend). The figures are sent back in a
+``Server-Timing`` header and added to in-process histograms for the resolved
+view, which staff can read as JSON from the metrics view. Each server process
+keeps its own histograms.
+
+Queries are timed by an execute wrapper installed on every database connection
+as it is created, which adds them to the metrics of the request in the current
+context. Context variables are copied into the thread that runs a sync view
+under ASGI, so queries are counted however the view is run.
+"""
+
+import contextvars
+import threading
+import time
+
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+from .middleware import AsyncCapableMiddleware
+
+TIME_BUCKETS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]  # ms
+COUNT_BUCKETS = [0, 1, 2, 5, 10, 20, 50, 100, 200]
+
+_current = contextvars.ContextVar("request_metrics", default=None)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = 0
+        self.query_time = 0.0
+        self.template_time = 0.0
+        self.rendering = False
+
+    def __call__(self, execute, sql, params, many, context):
+        """Execute wrapper that times every query."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.query_time += time.perf_counter() - start
+            self.queries += 1
+
+
+def time_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics(execute, sql, params, many, context)
+
+
+def install_query_timer(sender, connection, **kwargs):
+    """Add ``time_query`` to a new connection (``connection_created`` receiver)."""
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def as_dict(self):
+        labels = [f"<={bound}" for bound in self.buckets] + [f">{self.buckets[-1]}"]
+        return {
+            "mean": round(self.total / self.count, 2) if self.count else None,
+            "max": round(self.max, 2),
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class ViewStats:
+    def __init__(self):
+        self.wall_time = Histogram(TIME_BUCKETS)
+        self.queries = Histogram(COUNT_BUCKETS)
+        self.query_time = Histogram(TIME_BUCKETS)
+        self.template_time = Histogram(TIME_BUCKETS)
+
+    def as_dict(self):
+        return {
+            "requests": self.wall_time.count,
+            "wall_time_ms": self.wall_time.as_dict(),
+            "queries": self.queries.as_dict(),
+            "query_time_ms": self.query_time.as_dict(),
+            "template_time_ms": self.template_time.as_dict(),
+        }
+
+
+_stats = {}
+_lock = threading.Lock()
+
+
+def record(view_name, wall_time, metrics):
+    """Add a request's figures (times in ms) to the histograms for its view."""
+    with _lock:
+        stats = _stats.get(view_name)
+        if stats is None:
+            stats = _stats[view_name] = ViewStats()
+        stats.wall_time.add(wall_time)
+        stats.queries.add(metrics.queries)
+        stats.query_time.add(metrics.query_time * 1000)
+        stats.template_time.add(metrics.template_time * 1000)
+
+
+def snapshot():
+    with _lock:
+        return {name: stats.as_dict() for name, stats in sorted(_stats.items())}
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+
+
+class RequestMetricsMiddleware(AsyncCapableMiddleware):
+    """Measure every request and add a ``Server-Timing`` header to the response.
+
+    The figures for a streaming response are only recorded once its content
+    has been sent, and include any queries made while generating it.
+    """
+
+    def handle(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.process_response(request, response, metrics, start)
+
+    async def ahandle(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.process_response(request, response, metrics, start)
+
+    def process_response(self, request, response, metrics, start):
+        wall_time = (time.perf_counter() - start) * 1000
+        response["Server-Timing"] = (
+            f"total;dur={wall_time:.1f}, "
+            f'db;dur={metrics.query_time * 1000:.1f};desc="{metrics.queries} queries", '
+            f"template;dur={metrics.template_time * 1000:.1f}"
+        )
+        if response.streaming:
+            response.streaming_content = self.measure_stream(
+                request, response.streaming_content, metrics, start
+            )
+        else:
+            self.finish(request, metrics, start)
+        return response
+
+    def measure_stream(self, request, content, metrics, start):
+        """Generate the streaming content, recording the metrics once it closes."""
+        try:
+            iterator = iter(content)
+            while True:
+                token = _current.set(metrics)
+                try:
+                    chunk = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    _current.reset(token)
+                yield chunk
+        finally:
+            self.finish(request, metrics, start)
+
+    def finish(self, request, metrics, start):
+        wall_time = (time.perf_counter() - start) * 1000
+        match = request.resolver_match
+        record(match.view_name if match else "<unresolved>", wall_time, metrics)
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        # Templates rendered while rendering another one are already timed.
+        if metrics is None or metrics.rendering:
+            return super().render(context, request)
+        metrics.rendering = True
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_time += time.perf_counter() - start
+            metrics.rendering = False
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """Django template backend that times rendering for the metrics."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
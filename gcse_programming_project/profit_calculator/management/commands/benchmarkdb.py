@@ -0,0 +1,144 @@
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management import BaseCommand
+
+
+def run_workload(path, pragmas, readers, writers, duration, rows):
+    """Run concurrent readers and writers on a database for ``duration`` seconds.
+
+    Returns the number of reads, writes and "database is locked" errors.
+    """
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    lock = threading.Lock()
+    stop = time.monotonic() + duration
+
+    def connect():
+        connection = sqlite3.connect(path, isolation_level=None)
+        for pragma, value in pragmas.items():
+            connection.execute(f"PRAGMA {pragma} = {value}")
+        return connection
+
+    def reader():
+        connection = connect()
+        reads = errors = 0
+        while time.monotonic() < stop:
+            start = random.randrange(rows)
+            try:
+                connection.execute(
+                    "SELECT sum(value) FROM plan WHERE id BETWEEN ? AND ?",
+                    (start, start + 100),
+                ).fetchone()
+                reads += 1
+            except sqlite3.OperationalError:
+                errors += 1
+        connection.close()
+        with lock:
+            counts["reads"] += reads
+            counts["errors"] += errors
+
+    def writer():
+        connection = connect()
+        writes = errors = 0
+        while time.monotonic() < stop:
+            try:
+                connection.execute(
+                    "UPDATE plan SET value = value + 1 WHERE id = ?",
+                    (random.randrange(rows),),
+                )
+                writes += 1
+            except sqlite3.OperationalError:
+                errors += 1
+        connection.close()
+        with lock:
+            counts["writes"] += writes
+            counts["errors"] += errors
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)] + [
+        threading.Thread(target=writer) for _ in range(writers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return counts
+
+
+class Command(BaseCommand):
+    help = (
+        "compare the throughput of concurrent reads and writes on a scratch SQLite "
+        "database with SQLite's defaults and with SQLITE_PRAGMAS"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-r",
+            "--readers",
+            help="number of reading threads (default: 6)",
+            type=int,
+            default=6,
+        )
+        parser.add_argument(
+            "-w",
+            "--writers",
+            help="number of writing threads (default: 2)",
+            type=int,
+            default=2,
+        )
+        parser.add_argument(
+            "-d",
+            "--duration",
+            help="seconds to run each profile for (default: 3)",
+            type=float,
+            default=3,
+        )
+        parser.add_argument(
+            "--rows",
+            help="number of rows in the table (default: 10000)",
+            type=int,
+            default=10000,
+        )
+
+    def handle(self, *args, **options):
+        profiles = {
+            "default": {"busy_timeout": 5000},
+            "tuned": settings.SQLITE_PRAGMAS,
+        }
+        results = {}
+        for name, pragmas in profiles.items():
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, "benchmark.sqlite3")
+                connection = sqlite3.connect(path)
+                connection.execute(
+                    "CREATE TABLE plan (id INTEGER PRIMARY KEY, value INTEGER)"
+                )
+                connection.executemany(
+                    "INSERT INTO plan VALUES (?, 0)",
+                    ((i,) for i in range(options["rows"])),
+                )
+                connection.commit()
+                connection.close()
+                counts = run_workload(
+                    path,
+                    pragmas,
+                    options["readers"],
+                    options["writers"],
+                    options["duration"],
+                    options["rows"],
+                )
+            results[name] = (counts["reads"] + counts["writes"]) / options["duration"]
+            self.stdout.write(
+                f"{name}: {counts['reads']} reads, {counts['writes']} writes and "
+                f"{counts['errors']} lock errors ({results[name]:.0f} queries/s)"
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"The tuned profile ran {results['tuned'] / results['default']:.1f}x "
+                f"as many queries"
+            )
+        )
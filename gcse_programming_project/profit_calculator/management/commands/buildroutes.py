@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from profit_calculator import reference
+from profit_calculator.calculations import great_circle_distances
+from profit_calculator.feasibility import rebuild_feasibility
+from profit_calculator.models import Airport, Route
+
+
+class Command(BaseCommand):
+    help = (
+        "work out the distance from each origin airport to every foreign airport "
+        "that doesn't already have a route, e.g. after adding an origin airport"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-b",
+            "--batch-size",
+            help="number of routes written to the database at once (default: 1000)",
+            type=int,
+            default=1000,
+        )
+
+    def handle(self, *args, **options):
+        origins = settings.ORIGIN_AIRPORTS
+        existing = set(Route.objects.values_list("origin", "destination"))
+        airports = list(
+            Airport.objects.filter(
+                latitude__isnull=False, longitude__isnull=False
+            ).values_list("code", "latitude", "longitude")
+        )
+        distances = great_circle_distances(
+            [(origin["latitude"], origin["longitude"]) for origin in origins.values()],
+            [(latitude, longitude) for _, latitude, longitude in airports],
+        )
+        routes = [
+            Route(origin=origin, destination_id=code, distance=distance)
+            for (code, _, _), row in zip(airports, distances)
+            for origin, distance in zip(origins, row)
+            if (origin, code) not in existing
+        ]
+        with transaction.atomic():
+            Route.objects.bulk_create(routes, batch_size=options["batch_size"])
+            if routes:
+                reference.routes.invalidate()
+                rebuild_feasibility(
+                    airports={route.destination_id for route in routes},
+                    batch_size=options["batch_size"],
+                )
+        self.stdout.write(self.style.SUCCESS(f"Created {len(routes)} routes"))
@@ -1,45 +1,176 @@
-import argparse
 import csv
-from decimal import Decimal
+import gzip
+import hashlib
+import io
+import sys
+import time
+from decimal import Decimal, InvalidOperation
 
+from django.conf import settings
 from django.core.management import BaseCommand, CommandError
-from django.forms import model_to_dict
-from profit_calculator.models import Aircraft, Airport
+from django.db import transaction
+
+from profit_calculator import reference
+from profit_calculator.calculations import great_circle_distances
+from profit_calculator.feasibility import rebuild_feasibility
+from profit_calculator.models import Aircraft, Airport, Route
+from profit_calculator.propagation import propagate, propagate_deletion
+
+GZIP_MAGIC = b"\x1f\x8b"
 
 
 def get_airport_object(row):
-    return Airport(
+    """Airport from a ``code,name,latitude,longitude[,ORIGIN=distance...]`` row.
+
+    Route distances are the great-circle distances from each of the origin
+    airports unless they are given explicitly at the end of the row.
+    """
+    if len(row) < 4:
+        raise ValueError("Airport rows must have at least 4 columns")
+    airport = Airport(
         code=row[0],
         name=row[1],
-        distance_from_lpl=int(row[2]),
-        distance_from_boh=int(row[3]),
+        latitude=float(row[2]),
+        longitude=float(row[3]),
+    )
+    # Written this way round so that NaN is rejected too.
+    if not -90 <= airport.latitude <= 90:
+        raise ValueError("Latitudes must be between -90 and 90")
+    if not -180 <= airport.longitude <= 180:
+        raise ValueError("Longitudes must be between -180 and 180")
+    origins = settings.ORIGIN_AIRPORTS
+    distances = great_circle_distances(
+        [(origin["latitude"], origin["longitude"]) for origin in origins.values()],
+        [(airport.latitude, airport.longitude)],
+    )[0]
+    airport.route_distances = dict(zip(origins, distances))
+    for column in row[4:]:
+        origin, distance = column.split("=")
+        if origin not in origins:
+            raise ValueError(f"Unknown origin airport {origin}")
+        airport.route_distances[origin] = int(distance)
+    return airport
+
+
+def get_existing_airports():
+    routes = {}
+    for destination, origin, distance in Route.objects.values_list(
+        "destination", "origin", "distance"
+    ).iterator():
+        routes.setdefault(destination, {})[origin] = distance
+    for code, name, latitude, longitude in Airport.objects.values_list(
+        "code", "name", "latitude", "longitude"
+    ).iterator():
+        yield code, [name, latitude, longitude, sorted(routes.get(code, {}).items())]
+
+
+def get_airport_values(airport):
+    return [
+        airport.name,
+        airport.latitude,
+        airport.longitude,
+        sorted(airport.route_distances.items()),
+    ]
+
+
+def write_routes(airports, created):
+    if not created:
+        Route.objects.filter(
+            destination__in=[airport.pk for airport in airports]
+        ).delete()
+    Route.objects.bulk_create(
+        Route(origin=origin, destination=airport, distance=distance)
+        for airport in airports
+        for origin, distance in airport.route_distances.items()
     )
 
 
 def get_aircraft_object(row):
+    if len(row) != 5:
+        raise ValueError("Aircraft rows must have 5 columns")
     return Aircraft(
         type=row[0],
-        running_cost=Decimal(row[1]),
+        running_cost=Decimal(row[1]).quantize(Decimal("0.01")),
         range=int(row[2]),
         max_standard_class=int(row[3]),
         min_first_class=int(row[4]),
     )
 
 
+AIRCRAFT_FIELDS = ["running_cost", "range", "max_standard_class", "min_first_class"]
+
+
+def get_existing_aircraft():
+    for row in Aircraft.objects.values_list("pk", *AIRCRAFT_FIELDS).iterator():
+        yield row[0], list(row[1:])
+
+
+def get_aircraft_values(aircraft):
+    return [getattr(aircraft, field) for field in AIRCRAFT_FIELDS]
+
+
+IMPORT_TYPES = {
+    "airport": {
+        "model": Airport,
+        "get_object": get_airport_object,
+        "get_existing": get_existing_airports,
+        "get_values": get_airport_values,
+        "write_related": write_routes,
+        "caches": [reference.airports, reference.routes],
+        "feasibility": "airports",
+        "fields": ["name", "latitude", "longitude"],
+    },
+    "aircraft": {
+        "model": Aircraft,
+        "get_object": get_aircraft_object,
+        "get_existing": get_existing_aircraft,
+        "get_values": get_aircraft_values,
+        "write_related": None,
+        "caches": [reference.aircraft],
+        "feasibility": "aircraft",
+        "fields": AIRCRAFT_FIELDS,
+    },
+}
+
+
+def row_hash(values):
+    """Hash of a row's values, used to find rows that have changed."""
+    return hashlib.blake2b(repr(tuple(values)).encode(), digest_size=16).digest()
+
+
+def open_csv(path):
+    """Open a csv file for reading text, decompressing it if it is gzipped."""
+    if path == "-":
+        return sys.stdin
+    file = open(path, "rb")
+    if file.peek(2)[:2] == GZIP_MAGIC:
+        file = gzip.GzipFile(fileobj=file)
+    return io.TextIOWrapper(file, encoding="utf-8", newline="")
+
+
+def batched(items, size):
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
 class Command(BaseCommand):
-    help = "import airport or aircraft data from csv files (with no headers)"
+    help = (
+        "import airport or aircraft data from csv files (with no headers) - "
+        "airport rows are code,name,latitude,longitude optionally followed by "
+        "ORIGIN=distance columns, aircraft rows are "
+        "type,running_cost,range,max_standard_class,min_first_class"
+    )
 
     def add_arguments(self, parser):
         parser.add_argument(
             "type",
-            choices=("airport", "aircraft"),
+            choices=IMPORT_TYPES.keys(),
             help="the type of object being imported",
             metavar="object",
         )
         parser.add_argument(
             "file",
-            type=argparse.FileType("rt"),
-            help="path to the csv file",
+            help="path to the csv file (can be gzipped, or - for stdin)",
             metavar="csv-file",
         )
         parser.add_argument(
@@ -49,71 +180,122 @@ class Command(BaseCommand):
             action="store_true",
             dest="confirm",
         )
+        parser.add_argument(
+            "-b",
+            "--batch-size",
+            help="number of rows written to the database at once (default: 1000)",
+            type=int,
+            default=1000,
+        )
 
     def handle(self, *args, **options):
         if (
             options["confirm"]
             or input("This will overwrite existing data. Are you sure? [y/n]: ") == "y"
         ):
-            if options["type"] == "airport":
-                model = Airport
-                length = 4
-                existing = [airport.code for airport in Airport.objects.all()]
-                get_object = get_airport_object
-                pk = "code"
-                fields = ["name", "distance_from_lpl", "distance_from_boh"]
-            elif options["type"] == "aircraft":
-                model = Aircraft
-                length = 5
-                existing = [aircraft.type for aircraft in Aircraft.objects.all()]
-                get_object = get_aircraft_object
-                pk = "type"
-                fields = [
-                    "running_cost",
-                    "range",
-                    "max_standard_class",
-                    "min_first_class",
-                ]
-
-            reader = list(csv.reader(options["file"]))
-            create_objects = []
-            update_objects = []
-            options["file"].close()
-
-            for row in reader:
-                if len(row) != length:
-                    raise CommandError("Some lines of the csv file are invalid")
-                objects = update_objects if row[0] in existing else create_objects
-                objects.append(get_object(row))
-
-            pk_list = [obj.pk for obj in create_objects + update_objects]
-            changes = False
-
-            if update_objects:
-                existing_model_dicts = [
-                    model_to_dict(obj) for obj in model.objects.all()
-                ]
-                need_updating = []
-                for obj in update_objects:
-                    if model_to_dict(obj) in existing_model_dicts:
-                        continue
+            import_type = IMPORT_TYPES[options["type"]]
+            model = import_type["model"]
+            fields = import_type["fields"]
+            batch_size = options["batch_size"]
+            if batch_size < 1:
+                raise CommandError("The batch size must be at least 1")
+            start = time.monotonic()
+
+            try:
+                file = open_csv(options["file"])
+            except OSError as e:
+                raise CommandError(f"Could not open the csv file: {e}")
+
+            with file, transaction.atomic():
+                existing = {
+                    pk: row_hash(values) for pk, values in import_type["get_existing"]()
+                }
+                seen = set()
+                create_objects = []
+                update_objects = []
+                created = []
+                updated = []
+
+                def write_created():
+                    model.objects.bulk_create(create_objects)
+                    if import_type["write_related"]:
+                        import_type["write_related"](create_objects, created=True)
+
+                def write_updated():
+                    model.objects.bulk_update(update_objects, fields)
+                    if import_type["write_related"]:
+                        import_type["write_related"](update_objects, created=False)
+
+                for line_number, row in enumerate(csv.reader(file), start=1):
+                    try:
+                        obj = import_type["get_object"](row)
+                    except (ValueError, InvalidOperation):
+                        raise CommandError(
+                            f"Line {line_number} of the csv file is invalid"
+                        )
+                    if obj.pk in seen:
+                        raise CommandError(
+                            f"Line {line_number} of the csv file is a duplicate"
+                        )
+                    seen.add(obj.pk)
+
+                    if obj.pk not in existing:
+                        create_objects.append(obj)
+                    elif existing[obj.pk] != row_hash(import_type["get_values"](obj)):
+                        update_objects.append(obj)
+
+                    if len(create_objects) >= batch_size:
+                        write_created()
+                        created += [obj.pk for obj in create_objects]
+                        create_objects = []
+                    if len(update_objects) >= batch_size:
+                        write_updated()
+                        updated += [obj.pk for obj in update_objects]
+                        update_objects = []
+
+                write_created()
+                created += [obj.pk for obj in create_objects]
+                write_updated()
+                updated += [obj.pk for obj in update_objects]
+
+                to_delete = [pk for pk in existing if pk not in seen]
+                # Flight plans using the deleted rows are recalculated afterwards,
+                # which marks them incomplete.
+                if options["type"] == "airport":
+                    deleted = {"airports": to_delete}
+                else:
+                    deleted = {"aircraft": to_delete}
+                with propagate_deletion(**deleted, chunk_size=batch_size):
+                    for batch in batched(to_delete, batch_size):
+                        model.objects.filter(pk__in=batch).delete()
+
+                if created or updated or to_delete:
+                    for cache in import_type["caches"]:
+                        cache.invalidate()
+                    # Rows for deleted airports and aircraft are deleted with them.
+                    rebuild_feasibility(
+                        **{import_type["feasibility"]: created + updated},
+                        batch_size=batch_size,
+                    )
+
+                recalculated = 0
+                if updated:
+                    if options["type"] == "airport":
+                        recalculated = propagate(airports=updated)
                     else:
-                        need_updating.append(obj)
-                if need_updating:
-                    model.objects.bulk_update(need_updating, fields)
-                    changes = True
-
-            if create_objects:
-                model.objects.bulk_create(create_objects)
-                changes = True
-
-            to_delete = model.objects.exclude(pk__in=pk_list)
-            if to_delete:
-                to_delete.delete()
-                changes = True
-
-            if changes:
-                self.stdout.write(self.style.SUCCESS("Data imported successfully"))
+                        recalculated = propagate(aircraft=updated)
+
+            if created or updated or to_delete:
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f"Data imported successfully - {len(created)} created, "
+                        f"{len(updated)} updated, {len(to_delete)} deleted and "
+                        f"{len(seen) - len(created) - len(updated)} unchanged "
+                        f"in {time.monotonic() - start:.2f}s"
+                    )
+                )
+                if recalculated:
+                    self.stdout.write(f"Recalculated {recalculated} flight plans")
             else:
                 self.stdout.write(
                     "No changes made - existing database data matches that of the file"
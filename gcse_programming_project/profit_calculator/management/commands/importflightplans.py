@@ -0,0 +1,58 @@
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.management import BaseCommand, CommandError
+
+from profit_calculator.imports import (
+    EXTENSIONS,
+    READERS,
+    FlightPlanImportError,
+    build_flightplans,
+    read_flightplans,
+)
+from profit_calculator.services import import_flightplans
+
+
+class Command(BaseCommand):
+    help = "import the flight plans in an exported JSON, NDJSON, YAML or CSV file for a user"
+
+    def add_arguments(self, parser):
+        parser.add_argument("username", help="user the flight plans are created for")
+        parser.add_argument("file", help="file exported from the export page")
+        parser.add_argument(
+            "-f",
+            "--format",
+            choices=READERS,
+            help="format of the file, if it can't be told from its extension",
+        )
+        parser.add_argument(
+            "-b",
+            "--batch-size",
+            type=int,
+            default=500,
+            help="number of flight plans saved in each transaction",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options["username"])
+        except User.DoesNotExist:
+            raise CommandError(f"Unknown user: {options['username']}")
+        path = Path(options["file"])
+        filetype = options["format"] or EXTENSIONS.get(path.suffix.lower())
+        if filetype is None:
+            raise CommandError(
+                "Unknown file format - use --format to give it explicitly"
+            )
+        try:
+            with open(path, encoding="utf-8-sig", newline="") as file:
+                records = read_flightplans(file, filetype)
+            flightplans = build_flightplans(user, records)
+        except OSError as e:
+            raise CommandError(f"The file could not be opened: {e}")
+        except FlightPlanImportError as e:
+            raise CommandError(f"The flight plans were not imported:\n{e}")
+        created = import_flightplans(flightplans, batch_size=options["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Imported {len(created)} flight plans successfully")
+        )
@@ -0,0 +1,53 @@
+from django.contrib.auth.models import User
+from django.core.management import BaseCommand, CommandError
+
+from profit_calculator.models import FlightPlan
+from profit_calculator.services import FlightPlanLimitError, bulk_create_flightplans
+
+
+class Command(BaseCommand):
+    help = "create a flight plan for each of the given users, optionally copied from a template"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "usernames", nargs="+", help="users to create flight plans for"
+        )
+        parser.add_argument(
+            "-n", "--save-name", help="name of the new flight plans", required=True
+        )
+        parser.add_argument(
+            "-t",
+            "--template",
+            help="id of a flight plan whose details are copied",
+            type=int,
+        )
+        parser.add_argument(
+            "--ignore-limit",
+            action="store_true",
+            help="create the flight plans even if a user would have too many",
+        )
+
+    def handle(self, *args, **options):
+        users = list(User.objects.filter(username__in=options["usernames"]))
+        missing = set(options["usernames"]) - {user.username for user in users}
+        if missing:
+            raise CommandError(f"Unknown users: {', '.join(sorted(missing))}")
+        template = None
+        if options["template"] is not None:
+            try:
+                template = FlightPlan.objects.select_related(
+                    "airport_plan", "aircraft_plan", "pricing_plan"
+                ).get(pk=options["template"])
+            except FlightPlan.DoesNotExist:
+                raise CommandError("The template flight plan does not exist")
+        try:
+            created = bulk_create_flightplans(
+                [(user, options["save_name"]) for user in users],
+                template=template,
+                ignore_limit=options["ignore_limit"],
+            )
+        except FlightPlanLimitError as e:
+            raise CommandError(f"{e} - use --ignore-limit to create them anyway")
+        self.stdout.write(
+            self.style.SUCCESS(f"Created {len(created)} flight plans successfully")
+        )
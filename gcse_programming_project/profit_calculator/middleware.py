@@ -1,44 +1,137 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.contrib import messages
 from django.shortcuts import redirect
-from django.urls import reverse_lazy
+from django.urls import reverse
+from django.utils.functional import SimpleLazyObject
+
+from .access import DEFAULT_POLICY, FLIGHTPLAN, PUBLIC, compile_access_policies
+from .models import FlightPlan
+
+
+class NoCurrentFlightplan(Exception):
+    """The current flight plan in the session no longer exists."""
+
+
+def get_flightplan(request):
+    """Load the current flight plan along with all of its related data.
+
+    The result is cached on the request so the flight plan is only fetched once,
+    in a single query, however many times it is used. Returns None if there is
+    no current flight plan.
+    """
+    if not hasattr(request, "_cached_flightplan"):
+        flightplan = None
+        if request.user.is_authenticated and "current_fp" in request.session:
+            flightplan = (
+                FlightPlan.objects.select_related(
+                    "airport_plan__foreign_airport",
+                    "aircraft_plan__aircraft",
+                    "pricing_plan",
+                )
+                .filter(pk=request.session["current_fp"], user=request.user)
+                .first()
+            )
+        request._cached_flightplan = flightplan
+    return request._cached_flightplan
+
 
+def has_cached_flightplan(request):
+    """Whether the current flight plan has already been loaded for this request."""
+    return hasattr(request, "_cached_flightplan")
+
+
+def clear_flightplan_cache(request):
+    """Forget the cached flight plan after the current flight plan changes."""
+    if hasattr(request, "_cached_flightplan"):
+        del request._cached_flightplan
+
+
+class AsyncCapableMiddleware:
+    """Base for middleware that can run without a thread hop under ASGI.
+
+    Subclasses implement ``process_request(request)`` and
+    ``aprocess_request(request)``, which return a response to send instead of
+    calling the view, or None to carry on. Middleware that needs to wrap the
+    call to the view overrides ``handle(request)`` and ``ahandle(request)``.
+    """
+
+    sync_capable = True
+    async_capable = True
 
-class LoginRequiredMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
-        self.login_url = reverse_lazy(settings.LOGIN_URL)
-        self.open_urls = [self.login_url] + [
-            reverse_lazy(url) for url in getattr(settings, "OPEN_URLS", [])
-        ]
+        self.is_async = asyncio.iscoroutinefunction(self.get_response)
+        if self.is_async:
+            # Mark the instance as a coroutine function, as Django does for its
+            # own middleware, so the handler awaits it.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
 
     def __call__(self, request):
-        if (
-            not request.user.is_authenticated
-            and request.path not in self.open_urls
-            and not request.path.startswith("/admin/")
-        ):
-            return redirect(self.login_url + "?next=" + request.path)
+        if self.is_async:
+            return self.ahandle(request)
+        return self.handle(request)
 
-        return self.get_response(request)
+    def handle(self, request):
+        return self.process_request(request) or self.get_response(request)
 
+    async def ahandle(self, request):
+        return await self.aprocess_request(request) or await self.get_response(request)
+
+    def process_request(self, request):
+        return None
+
+    async def aprocess_request(self, request):
+        return self.process_request(request)
+
+
+class CurrentFlightplanMiddleware(AsyncCapableMiddleware):
+    def process_request(self, request):
+        request.flightplan = SimpleLazyObject(lambda: get_flightplan(request))
+
+
+class AccessPolicyMiddleware(AsyncCapableMiddleware):
+    """Enforce the access requirement declared on each URL pattern.
+
+    See the access module for how requirements are declared.
+    """
 
-class FlightplanCookieRequiredMiddleware:
     def __init__(self, get_response):
-        self.get_response = get_response
-        self.login_url = reverse_lazy(settings.LOGIN_URL)
-        self.open_urls = [
-            self.login_url,
-            reverse_lazy("profit_calculator:flightplans"),
-        ] + [reverse_lazy(url) for url in getattr(settings, "OPEN_URLS", [])]
+        super().__init__(get_response)
+        self.paths, self.prefixes = compile_access_policies()
+        self.login_url = reverse(settings.LOGIN_URL)
+        self.flightplans_url = reverse("profit_calculator:flightplans")
 
-    def __call__(self, request):
-        if (
-            request.user.is_authenticated
-            and request.path not in self.open_urls
-            and not request.path.startswith("/admin/")
-            and not request.path.startswith("/flightplans/")
-            and "current_fp" not in request.session
-        ):
-            return redirect("profit_calculator:flightplans")
-
-        return self.get_response(request)
+    def get_policy(self, path):
+        policy = self.paths.get(path)
+        if policy is None:
+            policy = self.prefixes.get(path[: path.find("/", 1) + 1], DEFAULT_POLICY)
+        return policy
+
+    def check_access(self, request, policy):
+        if not request.user.is_authenticated:
+            return redirect(self.login_url + "?next=" + request.path)
+        if policy == FLIGHTPLAN and "current_fp" not in request.session:
+            return redirect(self.flightplans_url)
+
+    def process_request(self, request):
+        policy = self.get_policy(request.path_info)
+        if policy != PUBLIC:
+            return self.check_access(request, policy)
+
+    def process_exception(self, request, exception):
+        # Only raised once the view loads the flight plan, so that views which
+        # don't need it aren't slowed down checking that it still exists.
+        if isinstance(exception, NoCurrentFlightplan):
+            request.session.pop("current_fp", None)
+            messages.error(request, "Your current flight plan no longer exists.")
+            return redirect(self.flightplans_url)
+
+    async def aprocess_request(self, request):
+        policy = self.get_policy(request.path_info)
+        if policy != PUBLIC:
+            # Loading the user and session uses the database, which has to be
+            # done in a thread.
+            return await sync_to_async(self.check_access)(request, policy)
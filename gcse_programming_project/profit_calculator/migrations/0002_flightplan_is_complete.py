@@ -0,0 +1,36 @@
+# Generated by Django 3.2.25 on 2026-10-18 12:53
+
+from django.db import migrations, models
+
+
+def set_is_complete(apps, schema_editor):
+    FlightPlan = apps.get_model('profit_calculator', 'FlightPlan')
+    complete = (
+        FlightPlan.objects.exclude(airport_plan__uk_airport='')
+        .filter(
+            airport_plan__foreign_airport__isnull=False,
+            aircraft_plan__aircraft__isnull=False,
+            aircraft_plan__num_first_class__isnull=False,
+            aircraft_plan__aircraft__range__gt=models.F('airport_plan__distance'),
+            pricing_plan__standard_class_price__isnull=False,
+            pricing_plan__first_class_price__isnull=False,
+        )
+        .values('pk')
+    )
+    FlightPlan.objects.filter(pk__in=complete).update(is_complete=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profit_calculator', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flightplan',
+            name='is_complete',
+            field=models.BooleanField(db_index=True, default=False, verbose_name='complete'),
+        ),
+        migrations.RunPython(set_is_complete, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,94 @@
+# Generated by Django 3.2.25 on 2026-10-18 12:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def copy_distances_to_routes(apps, schema_editor):
+    Airport = apps.get_model('profit_calculator', 'Airport')
+    Route = apps.get_model('profit_calculator', 'Route')
+    Route.objects.bulk_create(
+        Route(origin=origin, destination=airport, distance=distance)
+        for airport in Airport.objects.all()
+        for origin, distance in [
+            ('LPL', airport.distance_from_lpl),
+            ('BOH', airport.distance_from_boh),
+        ]
+    )
+
+
+def copy_routes_to_distances(apps, schema_editor):
+    Airport = apps.get_model('profit_calculator', 'Airport')
+    Route = apps.get_model('profit_calculator', 'Route')
+    distances = {}
+    for destination, origin, distance in Route.objects.filter(
+        origin__in=['LPL', 'BOH']
+    ).values_list('destination', 'origin', 'distance'):
+        distances.setdefault(destination, {})[origin] = distance
+    airports = list(Airport.objects.all())
+    for airport in airports:
+        routes = distances.get(airport.pk, {})
+        airport.distance_from_lpl = routes.get('LPL', 0)
+        airport.distance_from_boh = routes.get('BOH', 0)
+    Airport.objects.bulk_update(airports, ['distance_from_lpl', 'distance_from_boh'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profit_calculator', '0003_referencedataversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='airport',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='airport',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='airportplan',
+            name='uk_airport',
+            field=models.CharField(default='', max_length=3, verbose_name='UK airport'),
+        ),
+        migrations.CreateModel(
+            name='Route',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('origin', models.CharField(max_length=3)),
+                ('distance', models.PositiveSmallIntegerField(verbose_name='distance (km)')),
+                ('destination', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='routes', to='profit_calculator.airport')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='route',
+            constraint=models.UniqueConstraint(fields=('origin', 'destination'), name='unique_route'),
+        ),
+        migrations.RunPython(copy_distances_to_routes, migrations.RunPython.noop),
+        # Made nullable before they are removed so that, when migrating
+        # backwards, they can be added back and filled in from the routes
+        # before they are made NOT NULL again.
+        migrations.AlterField(
+            model_name='airport',
+            name='distance_from_boh',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='airport',
+            name='distance_from_lpl',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        migrations.RunPython(migrations.RunPython.noop, copy_routes_to_distances),
+        migrations.RemoveField(
+            model_name='airport',
+            name='distance_from_boh',
+        ),
+        migrations.RemoveField(
+            model_name='airport',
+            name='distance_from_lpl',
+        ),
+    ]
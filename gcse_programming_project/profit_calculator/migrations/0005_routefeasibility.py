@@ -0,0 +1,77 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from profit_calculator.calculations import (
+    TWO_PLACES,
+    calculate_break_even_price,
+    calculate_cost_per_seat,
+)
+
+
+def build_feasibility(apps, schema_editor):
+    Aircraft = apps.get_model('profit_calculator', 'Aircraft')
+    Route = apps.get_model('profit_calculator', 'Route')
+    RouteFeasibility = apps.get_model('profit_calculator', 'RouteFeasibility')
+    aircraft = list(Aircraft.objects.all())
+    rows = []
+    for origin, destination, distance in Route.objects.values_list(
+        'origin', 'destination', 'distance'
+    ):
+        for obj in aircraft:
+            cost_per_seat = calculate_cost_per_seat(obj.running_cost, distance)
+            break_even_price = calculate_break_even_price(
+                cost_per_seat, obj.max_standard_class, obj.min_first_class
+            )
+            rows.append(
+                RouteFeasibility(
+                    origin=origin,
+                    destination_id=destination,
+                    aircraft_id=obj.pk,
+                    distance=distance,
+                    in_range=obj.range > distance,
+                    cost_per_seat=cost_per_seat.quantize(TWO_PLACES),
+                    break_even_price=(
+                        break_even_price.quantize(TWO_PLACES)
+                        if break_even_price is not None
+                        else None
+                    ),
+                )
+            )
+    RouteFeasibility.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profit_calculator', '0004_routes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RouteFeasibility',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('origin', models.CharField(max_length=3)),
+                ('distance', models.PositiveSmallIntegerField(verbose_name='distance (km)')),
+                ('in_range', models.BooleanField()),
+                ('cost_per_seat', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('break_even_price', models.DecimalField(decimal_places=2, help_text='Standard class price needed to break even with every seat sold, the minimum number of first class seats and first class at double the standard class price.', max_digits=10, null=True)),
+                ('aircraft', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='profit_calculator.aircraft')),
+                ('destination', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='profit_calculator.airport')),
+            ],
+            options={
+                'verbose_name_plural': 'route feasibility',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='routefeasibility',
+            index=models.Index(fields=['aircraft', 'origin', 'in_range'], name='profit_calc_aircraf_401068_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='routefeasibility',
+            constraint=models.UniqueConstraint(fields=('origin', 'destination', 'aircraft'), name='unique_route_feasibility'),
+        ),
+        migrations.RunPython(build_feasibility, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profit_calculator', '0005_routefeasibility'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='airportplan',
+            index=models.Index(fields=['uk_airport', 'foreign_airport'], name='profit_calc_uk_airp_f4673d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='flightplan',
+            index=models.Index(fields=['user', '-created', 'save_name'], name='profit_calc_user_id_93734d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='flightplan',
+            index=models.Index(fields=['user', 'is_complete', '-created'], name='profit_calc_user_id_9d9aaa_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pricingplan',
+            index=models.Index(fields=['profit', 'income'], name='profit_calc_profit_d2c4b5_idx'),
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_route_summary(apps, schema_editor):
+    FlightPlan = apps.get_model('profit_calculator', 'FlightPlan')
+    RouteSummary = apps.get_model('profit_calculator', 'RouteSummary')
+    totals = (
+        FlightPlan.objects.filter(is_complete=True)
+        .values(
+            'airport_plan__uk_airport',
+            'airport_plan__foreign_airport',
+            'aircraft_plan__aircraft',
+        )
+        .annotate(
+            num_flightplans=models.Count('pk'),
+            total_profit=models.Sum('pricing_plan__profit'),
+            total_income=models.Sum('pricing_plan__income'),
+            total_standard_class_price=models.Sum('pricing_plan__standard_class_price'),
+            total_first_class_price=models.Sum('pricing_plan__first_class_price'),
+        )
+        .order_by()
+    )
+    for row in totals:
+        origin = row.pop('airport_plan__uk_airport')
+        destination = row.pop('airport_plan__foreign_airport')
+        aircraft = row.pop('aircraft_plan__aircraft')
+        summary = RouteSummary.objects.create(
+            key=f'{origin}-{destination}-{aircraft}',
+            origin=origin,
+            destination_id=destination,
+            aircraft_id=aircraft,
+            **row,
+        )
+        FlightPlan.objects.filter(
+            is_complete=True,
+            airport_plan__uk_airport=origin,
+            airport_plan__foreign_airport=destination,
+            aircraft_plan__aircraft=aircraft,
+        ).update(route_summary=summary)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profit_calculator', '0006_flightplan_sort_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RouteSummary',
+            fields=[
+                ('key', models.CharField(max_length=40, primary_key=True, serialize=False)),
+                ('origin', models.CharField(max_length=3)),
+                ('num_flightplans', models.IntegerField(default=0, verbose_name='number of flight plans')),
+                ('total_profit', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('total_income', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('total_standard_class_price', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('total_first_class_price', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('aircraft', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='profit_calculator.aircraft')),
+                ('destination', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='profit_calculator.airport')),
+            ],
+            options={
+                'verbose_name_plural': 'route summaries',
+            },
+        ),
+        migrations.AddField(
+            model_name='flightplan',
+            name='route_summary',
+            field=models.ForeignKey(blank=True, editable=False, help_text='The route summary row this flight plan is counted in.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='profit_calculator.routesummary'),
+        ),
+        migrations.AddConstraint(
+            model_name='routesummary',
+            constraint=models.UniqueConstraint(fields=('origin', 'destination', 'aircraft'), name='unique_route_summary'),
+        ),
+        migrations.RunPython(build_route_summary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:25
+
+from django.db import migrations, models
+
+
+def set_updated(apps, schema_editor):
+    FlightPlan = apps.get_model('profit_calculator', 'FlightPlan')
+    FlightPlan.objects.update(updated=models.F('created'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profit_calculator', '0007_routesummary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flightplan',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, verbose_name='date updated'),
+        ),
+        migrations.AddField(
+            model_name='flightplan',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+        migrations.RunPython(set_updated, migrations.RunPython.noop),
+    ]
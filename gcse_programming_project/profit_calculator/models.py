@@ -1,21 +1,103 @@
 from decimal import Decimal
 
-from django.contrib import admin
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
+
+from . import analytics, navbar, reference
+from .calculations import (
+    calculate_cost_per_seat,
+    calculate_num_standard_class,
+    calculate_profit,
+)
+
+
+class TrackedFieldsMixin:
+    """Remember the values of ``tracked_fields`` so changes to them can be found.
+
+    The values are recorded when an object is loaded from the database and
+    again every time it is saved.
+    """
+
+    tracked_fields = []
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._record_tracked_values()
+        return instance
+
+    def _get_tracked_value(self, name):
+        field = self._meta.get_field(name)
+        value = getattr(self, field.attname)
+        if isinstance(field, models.DecimalField) and value is not None:
+            # Calculated values are only stored to the field's decimal places.
+            value = value.quantize(Decimal(10) ** -field.decimal_places)
+        return value
+
+    def _record_tracked_values(self):
+        deferred = self.get_deferred_fields()
+        self._tracked_values = {
+            name: self._get_tracked_value(name)
+            for name in self.tracked_fields
+            if self._meta.get_field(name).attname not in deferred
+        }
+
+    def has_changed(self, *names):
+        """Whether any of the given tracked fields (default: all) have changed."""
+        tracked_values = getattr(self, "_tracked_values", None)
+        if tracked_values is None or self._state.adding:
+            return True
+        return any(
+            name not in tracked_values
+            or self._get_tracked_value(name) != tracked_values[name]
+            for name in names or self.tracked_fields
+        )
+
+    def get_previous_value(self, name):
+        """The value of a tracked field when it was loaded or last saved."""
+        tracked_values = getattr(self, "_tracked_values", None)
+        if tracked_values is None or self._state.adding:
+            return None
+        return tracked_values.get(name)
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._record_tracked_values()
 
 
 class Airport(models.Model):
     code = models.CharField(max_length=3, primary_key=True)
     name = models.CharField(max_length=50, unique=True)
-    distance_from_lpl = models.PositiveSmallIntegerField()
-    distance_from_boh = models.PositiveSmallIntegerField()
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
 
     def __str__(self):
         return self.name
 
 
+class Route(models.Model):
+    """Distance from one of the ``ORIGIN_AIRPORTS`` to a foreign airport."""
+
+    origin = models.CharField(max_length=3)
+    destination = models.ForeignKey(
+        Airport, on_delete=models.CASCADE, related_name="routes"
+    )
+    distance = models.PositiveSmallIntegerField("distance (km)")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["origin", "destination"], name="unique_route"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.origin} to {self.destination_id}"
+
+
 class Aircraft(models.Model):
     type = models.CharField(max_length=30, primary_key=True)
     running_cost = models.DecimalField(
@@ -31,37 +113,134 @@ class Aircraft(models.Model):
         return self.type
 
 
-class AirportPlan(models.Model):
-    uk_airport = models.CharField(
-        "UK airport",
-        max_length=3,
-        choices=[
-            ("LPL", "Liverpool John Lennon Airport"),
-            ("BOH", "Bournemouth International Airport"),
-        ],
-        default="",
+class RouteFeasibility(models.Model):
+    """Whether an aircraft can fly a route, and what it costs to do so.
+
+    The table is rebuilt from the route and aircraft tables by
+    ``feasibility.rebuild_feasibility`` whenever either of them changes.
+    """
+
+    origin = models.CharField(max_length=3)
+    destination = models.ForeignKey(Airport, on_delete=models.CASCADE, related_name="+")
+    aircraft = models.ForeignKey(Aircraft, on_delete=models.CASCADE, related_name="+")
+    distance = models.PositiveSmallIntegerField("distance (km)")
+    in_range = models.BooleanField()
+    cost_per_seat = models.DecimalField(max_digits=10, decimal_places=2)
+    break_even_price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        help_text="Standard class price needed to break even with every seat sold, "
+        "the minimum number of first class seats and first class at double the "
+        "standard class price.",
     )
+
+    class Meta:
+        verbose_name_plural = "route feasibility"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["origin", "destination", "aircraft"],
+                name="unique_route_feasibility",
+            )
+        ]
+        indexes = [models.Index(fields=["aircraft", "origin", "in_range"])]
+
+    def __str__(self):
+        return f"{self.aircraft_id} from {self.origin} to {self.destination_id}"
+
+
+class RouteSummary(models.Model):
+    """Running totals of the complete flight plans for a route and aircraft.
+
+    Saving a flight plan adds its figures to the row for its current route and
+    aircraft (and takes them away from the row it was counted in before), so the
+    analytics page never has to aggregate every flight plan.
+    """
+
+    key = models.CharField(max_length=40, primary_key=True)
+    origin = models.CharField(max_length=3)
+    destination = models.ForeignKey(Airport, on_delete=models.CASCADE, related_name="+")
+    aircraft = models.ForeignKey(Aircraft, on_delete=models.CASCADE, related_name="+")
+    num_flightplans = models.IntegerField("number of flight plans", default=0)
+    total_profit = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    total_income = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    total_standard_class_price = models.DecimalField(
+        max_digits=16, decimal_places=2, default=0
+    )
+    total_first_class_price = models.DecimalField(
+        max_digits=16, decimal_places=2, default=0
+    )
+
+    class Meta:
+        verbose_name_plural = "route summaries"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["origin", "destination", "aircraft"],
+                name="unique_route_summary",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.aircraft_id} from {self.origin} to {self.destination_id}"
+
+    @staticmethod
+    def get_key(origin, destination, aircraft):
+        return f"{origin}-{destination}-{aircraft}"
+
+
+class ReferenceDataVersion(models.Model):
+    """Version stamp of a table cached in memory by the reference module."""
+
+    name = models.CharField(max_length=30, primary_key=True)
+    version = models.CharField(max_length=32)
+
+    def __str__(self):
+        return self.name
+
+
+class AirportPlan(TrackedFieldsMixin, models.Model):
+    tracked_fields = ["uk_airport", "foreign_airport", "distance"]
+
+    uk_airport = models.CharField("UK airport", max_length=3, default="")
     foreign_airport = models.ForeignKey(Airport, on_delete=models.SET_NULL, null=True)
     distance = models.PositiveSmallIntegerField(
         "distance between airports (km)", null=True, blank=True
     )
 
+    class Meta:
+        indexes = [models.Index(fields=["uk_airport", "foreign_airport"])]
+
     def details_exist(self):
-        return self.uk_airport != "" and self.foreign_airport != ""
+        return self.uk_airport != "" and self.foreign_airport_id is not None
+
+    def get_uk_airport_display(self):
+        airport = settings.ORIGIN_AIRPORTS.get(self.uk_airport)
+        return airport["name"] if airport is not None else self.uk_airport
+
+    def update_distance(self):
+        if self.details_exist():
+            route = reference.routes.get((self.uk_airport, self.foreign_airport_id))
+            if route is None:
+                route = Route.objects.filter(
+                    origin=self.uk_airport, destination=self.foreign_airport_id
+                ).first()
+            self.distance = route.distance if route is not None else None
+        else:
+            self.distance = None
 
     def save(self, *args, **kwargs):
         initial_creation = kwargs.pop("initial_creation", False)
-        if self.details_exist():
-            if self.uk_airport == "LPL":
-                self.distance = self.foreign_airport.distance_from_lpl
-            elif self.uk_airport == "BOH":
-                self.distance = self.foreign_airport.distance_from_boh
-        super().save(*args, **kwargs)
-        if not initial_creation:
-            self.flightplan.pricing_plan.update()
+        self.update_distance()
+        changed = self.has_changed()
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if not initial_creation and changed:
+                self.flightplan.pricing_plan.update(changed=True)
 
 
-class AircraftPlan(models.Model):
+class AircraftPlan(TrackedFieldsMixin, models.Model):
+    tracked_fields = ["aircraft", "num_first_class", "num_standard_class"]
+
     aircraft = models.ForeignKey(Aircraft, on_delete=models.SET_NULL, null=True)
     num_first_class = models.PositiveSmallIntegerField(
         "Number of first class seats", null=True
@@ -71,11 +250,16 @@ class AircraftPlan(models.Model):
     )
 
     def details_exist(self):
-        return self.aircraft is not None and self.num_first_class is not None
+        return self.aircraft_id is not None and self.num_first_class is not None
 
     def in_range(self):
-        if self.details_exist() and self.flightplan.airport_plan.details_exist():
-            return self.aircraft.range > self.flightplan.airport_plan.distance
+        airport_plan = self.flightplan.airport_plan
+        if (
+            self.details_exist()
+            and airport_plan.details_exist()
+            and airport_plan.distance is not None
+        ):
+            return self.aircraft.range > airport_plan.distance
         else:
             return None
 
@@ -90,18 +274,38 @@ class AircraftPlan(models.Model):
             )
         return super().clean()
 
-    def save(self, *args, **kwargs):
-        initial_creation = kwargs.pop("initial_creation", False)
+    def update_num_standard_class(self):
         if self.details_exist():
-            self.num_standard_class = (
-                self.aircraft.max_standard_class - self.num_first_class * 2
+            if not AircraftPlan.aircraft.is_cached(self):
+                aircraft = reference.aircraft.get(self.aircraft_id)
+                if aircraft is not None:
+                    self.aircraft = aircraft
+            self.num_standard_class = calculate_num_standard_class(
+                self.aircraft.max_standard_class, self.num_first_class
             )
-        super().save(*args, **kwargs)
-        if not initial_creation:
-            self.flightplan.pricing_plan.update()
+        else:
+            self.num_standard_class = None
+
+    def save(self, *args, **kwargs):
+        initial_creation = kwargs.pop("initial_creation", False)
+        self.update_num_standard_class()
+        changed = self.has_changed()
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if not initial_creation and changed:
+                self.flightplan.pricing_plan.update(changed=True)
 
 
-class PricingPlan(models.Model):
+class PricingPlan(TrackedFieldsMixin, models.Model):
+    tracked_fields = [
+        "standard_class_price",
+        "first_class_price",
+        "cost_per_seat",
+        "running_cost",
+        "income",
+        "profit",
+    ]
+
     standard_class_price = models.DecimalField(
         max_digits=7, decimal_places=2, null=True
     )
@@ -115,6 +319,9 @@ class PricingPlan(models.Model):
     income = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     profit = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
 
+    class Meta:
+        indexes = [models.Index(fields=["profit", "income"])]
+
     def details_exist(self):
         return (
             self.standard_class_price is not None and self.first_class_price is not None
@@ -123,29 +330,53 @@ class PricingPlan(models.Model):
     def profitable(self):
         return self.profit > 0
 
-    def update(self, *args, **kwargs):
+    def calculate(self):
+        """Recalculate the derived fields, returning whether the plan is complete.
+
+        The derived fields are cleared if it isn't.
+        """
         if self.flightplan.complete():
-            self.cost_per_seat = (
-                self.flightplan.aircraft_plan.aircraft.running_cost
-                * Decimal(self.flightplan.airport_plan.distance / 100)
-            )
-            self.running_cost = self.cost_per_seat * (
-                self.flightplan.aircraft_plan.num_first_class
-                + self.flightplan.aircraft_plan.num_standard_class
+            aircraft_plan = self.flightplan.aircraft_plan
+            self.cost_per_seat = calculate_cost_per_seat(
+                aircraft_plan.aircraft.running_cost,
+                self.flightplan.airport_plan.distance,
             )
-            self.income = (
-                self.flightplan.aircraft_plan.num_first_class * self.first_class_price
-                + self.flightplan.aircraft_plan.num_standard_class
-                * self.standard_class_price
+            self.running_cost, self.income, self.profit = calculate_profit(
+                self.cost_per_seat,
+                aircraft_plan.num_first_class,
+                aircraft_plan.num_standard_class,
+                self.first_class_price,
+                self.standard_class_price,
             )
-            self.profit = self.income - self.running_cost
+            return True
+        # Figures left from before the plan became incomplete would be wrong.
+        self.cost_per_seat = self.running_cost = self.income = self.profit = None
+        return False
+
+    def update(self, *args, changed=False, **kwargs):
+        """Recalculate after the airport or aircraft plan has ``changed``."""
+        complete = self.calculate()
+        # The summary uses the previous values, so it's worked out before saving.
+        summary_changes = analytics.SummaryChanges()
+        summary_changes.move(self.flightplan, self, complete)
+        if self.has_changed():
+            changed = True
             super().save(*args, **kwargs)
+        summary_changes.apply()
+        self.flightplan.update_completeness(complete, changed=changed)
 
     def save(self, *args, **kwargs):
         initial_creation = kwargs.pop("initial_creation", False)
-        super().save(*args, **kwargs)
-        if not initial_creation:
-            self.update()
+        if initial_creation:
+            return super().save(*args, **kwargs)
+        complete = self.calculate()
+        with transaction.atomic():
+            summary_changes = analytics.SummaryChanges()
+            summary_changes.move(self.flightplan, self, complete)
+            changed = self.has_changed()
+            super().save(*args, **kwargs)
+            summary_changes.apply()
+            self.flightplan.update_completeness(complete, changed=changed)
 
 
 def default_airportplan():
@@ -166,7 +397,46 @@ def default_pricingplan():
     return pp.pk
 
 
-class FlightPlan(models.Model):
+class FlightPlanQuerySet(models.QuerySet):
+    def with_summary(self):
+        """Annotate the route, aircraft, profit and profit margin (%).
+
+        These come from the sub-plans, so annotating them lets flight plans be
+        sorted and filtered by them in the database. The profit, income and
+        margin are NULL unless the flight plan is complete, as the stored figures
+        may be left over from before it became incomplete.
+        """
+        return self.annotate(
+            uk_airport=models.F("airport_plan__uk_airport"),
+            foreign_airport=models.F("airport_plan__foreign_airport"),
+            aircraft=models.F("aircraft_plan__aircraft"),
+            profit=models.Case(
+                models.When(is_complete=True, then=models.F("pricing_plan__profit")),
+                output_field=models.DecimalField(max_digits=10, decimal_places=2),
+            ),
+            income=models.Case(
+                models.When(is_complete=True, then=models.F("pricing_plan__income")),
+                output_field=models.DecimalField(max_digits=10, decimal_places=2),
+            ),
+            margin=models.Case(
+                models.When(
+                    is_complete=True,
+                    pricing_plan__income__gt=0,
+                    then=models.ExpressionWrapper(
+                        models.F("pricing_plan__profit")
+                        * 100.0
+                        / models.F("pricing_plan__income"),
+                        output_field=models.FloatField(),
+                    ),
+                ),
+                output_field=models.FloatField(),
+            ),
+        )
+
+
+class FlightPlan(TrackedFieldsMixin, models.Model):
+    tracked_fields = ["is_complete", "route_summary"]
+
     airport_plan = models.OneToOneField(
         AirportPlan,
         default=default_airportplan,
@@ -191,15 +461,67 @@ class FlightPlan(models.Model):
     save_name = models.CharField(max_length=100)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     created = models.DateTimeField("date created", auto_now_add=True)
+    is_complete = models.BooleanField("complete", default=False, db_index=True)
+    route_summary = models.ForeignKey(
+        RouteSummary,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name="+",
+        help_text="The route summary row this flight plan is counted in.",
+    )
+    version = models.PositiveIntegerField(default=1, editable=False)
+    updated = models.DateTimeField("date updated", auto_now=True)
+
+    objects = FlightPlanQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "-created", "save_name"]),
+            models.Index(fields=["user", "is_complete", "-created"]),
+        ]
 
     def __str__(self):
         return self.save_name
 
-    @admin.display(boolean=True)
     def complete(self):
-        return (
+        return bool(
             self.airport_plan.details_exist()
             and self.aircraft_plan.details_exist()
             and self.aircraft_plan.in_range()
             and self.pricing_plan.details_exist()
         )
+
+    def update_completeness(self, complete=None, changed=False):
+        """Store whether the flight plan is complete if it has changed.
+
+        The route summary row it is counted in is stored too. If one of the
+        sub-plans has ``changed``, the flight plan is saved even if neither has
+        changed so that its version is bumped.
+        """
+        if complete is None:
+            complete = self.complete()
+        self.is_complete = complete
+        fields = [name for name in self.tracked_fields if self.has_changed(name)]
+        if fields or changed:
+            self.save(update_fields=fields)
+            if "is_complete" in fields:
+                navbar.clear_cached_completeness([self])
+
+    def bump_version(self):
+        self.version += 1
+        self.updated = timezone.now()
+
+    def save(self, *args, **kwargs):
+        # Every change gets a new version, which pages showing the flight plan
+        # use as their ETag and fragment cache key.
+        if not self._state.adding:
+            self.bump_version()
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = [
+                    *kwargs["update_fields"],
+                    "version",
+                    "updated",
+                ]
+        super().save(*args, **kwargs)
@@ -0,0 +1,34 @@
+"""Navbar state cached between requests.
+
+Every page shows whether the current flight plan is complete, which would
+otherwise mean loading the flight plan on every request. The value is cached for
+each user and flight plan, and cleared whenever the save cascade changes it.
+"""
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+def get_cache():
+    return caches[settings.NAVBAR_CACHE_ALIAS]
+
+
+def get_completeness_key(user_id, flightplan_id):
+    return f"navbar-complete:{user_id}:{flightplan_id}"
+
+
+def get_cached_completeness(user_id, flightplan_id, load):
+    """Whether a flight plan is complete, calling ``load()`` if it isn't cached."""
+    key = get_completeness_key(user_id, flightplan_id)
+    complete = get_cache().get(key)
+    if complete is None:
+        complete = load()
+        get_cache().set(key, complete, settings.NAVBAR_CACHE_TIMEOUT)
+    return complete
+
+
+def clear_cached_completeness(flightplans):
+    """Forget the cached completeness of the given flight plans."""
+    keys = [get_completeness_key(fp.user_id, fp.pk) for fp in flightplans]
+    if keys:
+        get_cache().delete_many(keys)
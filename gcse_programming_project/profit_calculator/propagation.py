@@ -0,0 +1,190 @@
+"""Recalculate stored flight plans after airport or aircraft data changes.
+
+The values derived from the reference data (distances, number of standard class
+seats and the pricing figures) are normally only refreshed when a user saves one
+of the forms. When the reference data itself changes, every affected flight plan
+is loaded in one query per chunk, recalculated in memory and written back with
+``bulk_update`` instead of calling ``save()`` on each plan.
+
+Deleting an airport or aircraft sets it to NULL in the plans that used it, so
+those plans are looked up before the delete (see ``propagate_deletion``) and
+recalculated afterwards, which marks them incomplete and clears their figures.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Q
+
+from . import navbar
+from .analytics import SummaryChanges
+from .models import AircraftPlan, AirportPlan, FlightPlan, PricingPlan
+
+logger = logging.getLogger(__name__)
+
+AIRPORT_PLAN_FIELDS = ["distance"]
+AIRCRAFT_PLAN_FIELDS = ["num_standard_class"]
+PRICING_PLAN_FIELDS = ["cost_per_seat", "running_cost", "income", "profit"]
+FLIGHT_PLAN_FIELDS = ["is_complete", "route_summary", "version", "updated"]
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="propagation")
+
+
+def get_affected_flightplans(airports=(), aircraft=(), flightplans=()):
+    """Flight plans that use any of the given airport codes or aircraft types.
+
+    Flight plans with the primary keys in ``flightplans`` are included too.
+    """
+    return (
+        FlightPlan.objects.filter(
+            Q(airport_plan__foreign_airport__in=airports)
+            | Q(aircraft_plan__aircraft__in=aircraft)
+            | Q(pk__in=flightplans)
+        )
+        .select_related(
+            "airport_plan__foreign_airport",
+            "aircraft_plan__aircraft",
+            "pricing_plan",
+        )
+        .order_by("pk")
+    )
+
+
+def recalculate(flightplans):
+    """Recalculate a batch of flight plans in memory and save them in bulk."""
+    airport_plans = []
+    aircraft_plans = []
+    pricing_plans = []
+    summary_changes = SummaryChanges()
+    for fp in flightplans:
+        fp.airport_plan.update_distance()
+        fp.aircraft_plan.update_num_standard_class()
+        airport_plans.append(fp.airport_plan)
+        aircraft_plans.append(fp.aircraft_plan)
+        complete = fp.pricing_plan.calculate()
+        if fp.pricing_plan.has_changed():
+            pricing_plans.append(fp.pricing_plan)
+        summary_changes.move(fp, fp.pricing_plan, complete)
+        fp.is_complete = complete
+        fp.bump_version()
+    summary_changes.apply()
+    FlightPlan.objects.bulk_update(flightplans, FLIGHT_PLAN_FIELDS)
+    navbar.clear_cached_completeness(
+        [fp for fp in flightplans if fp.has_changed("is_complete")]
+    )
+    AirportPlan.objects.bulk_update(airport_plans, AIRPORT_PLAN_FIELDS)
+    AircraftPlan.objects.bulk_update(aircraft_plans, AIRCRAFT_PLAN_FIELDS)
+    PricingPlan.objects.bulk_update(pricing_plans, PRICING_PLAN_FIELDS)
+    return len(flightplans)
+
+
+def _batched(items, size):
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+def propagate(airports=(), aircraft=(), flightplans=(), chunk_size=None):
+    """Recalculate every flight plan affected by the given reference data.
+
+    ``flightplans`` are the primary keys of any other flight plans to
+    recalculate, such as those that used a deleted airport or aircraft. All
+    chunks are written inside one transaction so that readers never see a mix
+    of old and new values. Returns the number of flight plans recalculated.
+    """
+    airports = list(airports)
+    aircraft = list(aircraft)
+    flightplans = list(flightplans)
+    if not airports and not aircraft and not flightplans:
+        return 0
+    if chunk_size is None:
+        chunk_size = settings.PROPAGATION_CHUNK_SIZE
+    # Large imports can change more rows than a database allows parameters in
+    # one query, so the changed keys are looked up in batches too.
+    querysets = (
+        [
+            get_affected_flightplans(airports=batch)
+            for batch in _batched(airports, chunk_size)
+        ]
+        + [
+            get_affected_flightplans(aircraft=batch)
+            for batch in _batched(aircraft, chunk_size)
+        ]
+        + [
+            get_affected_flightplans(flightplans=batch)
+            for batch in _batched(flightplans, chunk_size)
+        ]
+    )
+    total = 0
+    with transaction.atomic():
+        for queryset in querysets:
+            last_pk = 0
+            while True:
+                chunk = list(queryset.filter(pk__gt=last_pk)[:chunk_size])
+                if not chunk:
+                    break
+                total += recalculate(chunk)
+                last_pk = chunk[-1].pk
+    return total
+
+
+@contextmanager
+def propagate_deletion(airports=(), aircraft=(), background=False, chunk_size=None):
+    """Recalculate the flight plans using airports or aircraft deleted in the block.
+
+    The flight plans are found before the block runs, as they can't be found by
+    the deleted rows afterwards. With ``background``, they're recalculated like
+    ``schedule_propagation`` instead of straight away.
+    """
+    if chunk_size is None:
+        chunk_size = settings.PROPAGATION_CHUNK_SIZE
+    flightplans = [
+        pk
+        for batch in _batched(list(airports), chunk_size)
+        for pk in get_affected_flightplans(airports=batch).values_list("pk", flat=True)
+    ] + [
+        pk
+        for batch in _batched(list(aircraft), chunk_size)
+        for pk in get_affected_flightplans(aircraft=batch).values_list("pk", flat=True)
+    ]
+    yield
+    if background:
+        schedule_propagation(flightplans=flightplans)
+    else:
+        propagate(flightplans=flightplans, chunk_size=chunk_size)
+
+
+def _run_in_background(airports, aircraft, flightplans):
+    try:
+        count = propagate(airports, aircraft, flightplans)
+        logger.info("Recalculated %d flight plans", count)
+    except Exception:
+        logger.exception("Failed to recalculate flight plans")
+    finally:
+        # The worker thread has its own connections which are never reused by a
+        # request, so they're closed as soon as the work is done.
+        connections.close_all()
+
+
+def schedule_propagation(airports=(), aircraft=(), flightplans=()):
+    """Recalculate affected flight plans once the current transaction commits.
+
+    The work is handed to a worker thread so that saving reference data in the
+    admin doesn't wait for every flight plan to be updated. If
+    ``PROPAGATE_IN_BACKGROUND`` is disabled it runs synchronously instead.
+    """
+    airports = list(airports)
+    aircraft = list(aircraft)
+    flightplans = list(flightplans)
+    if not airports and not aircraft and not flightplans:
+        return
+    if settings.PROPAGATE_IN_BACKGROUND:
+        transaction.on_commit(
+            lambda: _executor.submit(
+                _run_in_background, airports, aircraft, flightplans
+            )
+        )
+    else:
+        transaction.on_commit(lambda: propagate(airports, aircraft, flightplans))
@@ -0,0 +1,142 @@
+"""In-memory cache of the airport, aircraft and route tables.
+
+This data only changes through ``manage.py import`` or the admin site, so each
+process keeps a copy of the tables in memory. Every change stores a new
+version stamp in the database (see ``ReferenceDataVersion``). Each process checks
+the stamp at most once every ``REFERENCE_DATA_CHECK_INTERVAL`` seconds, so a
+change made by one process reaches all the others.
+"""
+
+import bisect
+import itertools
+import threading
+import time
+import uuid
+
+from django.apps import apps
+from django.conf import settings
+
+
+class ReferenceDataCache:
+    def __init__(self, model_name, ordering, key=None):
+        self.model_name = model_name
+        self.ordering = ordering
+        self.key = key or (lambda obj: obj.pk)
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked = 0.0
+        self._data = ([], {})
+
+    @property
+    def model(self):
+        return apps.get_model("profit_calculator", self.model_name)
+
+    def _get_version(self):
+        version_model = apps.get_model("profit_calculator", "ReferenceDataVersion")
+        return (
+            version_model.objects.filter(name=self.model_name)
+            .values_list("version", flat=True)
+            .first()
+        )
+
+    def _refresh(self):
+        now = time.monotonic()
+        if (
+            self._version is not None
+            and now - self._checked < settings.REFERENCE_DATA_CHECK_INTERVAL
+        ):
+            return
+        with self._lock:
+            version = self._get_version() or ""
+            if version != self._version:
+                objects = list(self.model.objects.order_by(*self.ordering))
+                self._data = self._load(objects)
+                self._version = version
+            self._checked = now
+
+    def _load(self, objects):
+        """The data kept in memory, replaced as a whole when the table changes."""
+        return (objects, {self.key(obj): obj for obj in objects})
+
+    def all(self):
+        """Every object in the table. The objects must not be modified."""
+        self._refresh()
+        return self._data[0]
+
+    def get(self, key):
+        """The object with the given key (usually the primary key), or None."""
+        self._refresh()
+        return self._data[1].get(key)
+
+    def invalidate(self):
+        """Record that the table has changed so that every process reloads it."""
+        version_model = apps.get_model("profit_calculator", "ReferenceDataVersion")
+        version_model.objects.update_or_create(
+            name=self.model_name, defaults={"version": uuid.uuid4().hex}
+        )
+        with self._lock:
+            self._version = None
+
+
+def _prefix_matches(index, prefix):
+    """Objects in a sorted (key, position, object) index whose key starts with
+    ``prefix``.
+    """
+    start = bisect.bisect_left(index, (prefix,))
+    for key, _, obj in itertools.islice(index, start, None):
+        if not key.startswith(prefix):
+            break
+        yield obj
+
+
+class AirportCache(ReferenceDataCache):
+    """Airport cache with a prefix index of the codes and the words in names."""
+
+    def _load(self, objects):
+        codes = []
+        words = []
+        names = []
+        for i, airport in enumerate(objects):
+            codes.append((airport.code.lower(), i, airport))
+            name = airport.name.lower()
+            words += [(word, i, airport) for word in set(name.split())]
+            names.append((name, airport))
+        codes.sort(key=lambda item: item[:2])
+        words.sort(key=lambda item: item[:2])
+        return super()._load(objects) + (codes, words, names)
+
+    def search(self, query, offset=0, limit=None):
+        """Airports matching a search, best matches first.
+
+        Airports whose code starts with the query come first, then those with a
+        word in their name starting with it, then those whose name contains it
+        anywhere. Only as much of the index as the page needs is searched.
+        """
+        self._refresh()
+        objects, _, codes, words, names = self._data
+        query = " ".join(query.lower().split())
+        if not query:
+            matches = iter(objects)
+        else:
+            matches = itertools.chain(
+                _prefix_matches(codes, query),
+                _prefix_matches(words, query),
+                (airport for name, airport in names if query in name),
+            )
+        seen = set()
+        unique = (
+            airport
+            for airport in matches
+            if airport.code not in seen and not seen.add(airport.code)
+        )
+        stop = offset + limit if limit is not None else None
+        return list(itertools.islice(unique, offset, stop))
+
+
+airports = AirportCache("Airport", ["code"])
+aircraft = ReferenceDataCache("Aircraft", ["type"])
+routes = ReferenceDataCache(
+    "Route",
+    ["origin", "destination"],
+    key=lambda route: (route.origin, route.destination_id),
+)
@@ -0,0 +1,252 @@
+"""Creation of flight plans together with their airport, aircraft and pricing plans.
+
+``FlightPlan``'s field defaults create each sub-plan with its own INSERT outside
+of any transaction. These functions create the sub-plans explicitly inside one
+transaction instead, and in bulk when creating many flight plans at once.
+"""
+
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Count, sql
+
+from .analytics import SummaryChanges, get_values
+from .models import AircraftPlan, AirportPlan, FlightPlan, PricingPlan
+
+MAX_FLIGHTPLANS = 25
+# The first version of SQLite with INSERT ... RETURNING.
+SQLITE_RETURNING_VERSION = (3, 35)
+
+
+class FlightPlanLimitError(Exception):
+    pass
+
+
+def _lock_users(users):
+    if connection.features.has_select_for_update:
+        list(
+            User.objects.select_for_update()
+            .filter(pk__in=[user.pk for user in users])
+            .values_list("pk")
+        )
+
+
+def check_flightplan_limit(user, adding=1):
+    """Raise ``FlightPlanLimitError`` if ``user`` can't have ``adding`` more.
+
+    Call this in the transaction that creates the flight plans. The user's row
+    is locked first where the database supports it, so concurrent requests
+    check the limit one at a time. SQLite only allows one writer, so the later
+    of two concurrent transactions fails instead.
+    """
+    _lock_users([user])
+    count = FlightPlan.objects.filter(user=user).count()
+    if count + adding <= MAX_FLIGHTPLANS:
+        return
+    if adding == 1:
+        raise FlightPlanLimitError(
+            f"You already have {MAX_FLIGHTPLANS} flightplans. This is the maximum "
+            f"allowed. Please delete at least one and then try again."
+        )
+    raise FlightPlanLimitError(
+        f"You can only have {MAX_FLIGHTPLANS} flight plans and already have "
+        f"{count}, so {adding} more can't be added."
+    )
+
+
+def check_flightplan_limits(users):
+    """Like ``check_flightplan_limit`` for many users, with one query.
+
+    ``users`` is an iterable with each user once for every flight plan they
+    are being given.
+    """
+    adding = Counter(users)
+    _lock_users(adding)
+    counts = dict(
+        FlightPlan.objects.filter(user__in=adding)
+        .values_list("user")
+        .annotate(count=Count("pk"))
+    )
+    over = [
+        f"{user.username} ({counts.get(user.pk, 0)} + {n})"
+        for user, n in adding.items()
+        if counts.get(user.pk, 0) + n > MAX_FLIGHTPLANS
+    ]
+    if over:
+        raise FlightPlanLimitError(
+            f"These users would have more than {MAX_FLIGHTPLANS} flight plans: "
+            f"{', '.join(over)}"
+        )
+
+
+def create_flightplan(user, save_name):
+    """Create an empty flight plan and its three sub-plans atomically."""
+    with transaction.atomic():
+        check_flightplan_limit(user)
+        airport_plan = AirportPlan()
+        airport_plan.save(initial_creation=True)
+        aircraft_plan = AircraftPlan()
+        aircraft_plan.save(initial_creation=True)
+        pricing_plan = PricingPlan()
+        pricing_plan.save(initial_creation=True)
+        return FlightPlan.objects.create(
+            save_name=save_name,
+            user=user,
+            airport_plan=airport_plan,
+            aircraft_plan=aircraft_plan,
+            pricing_plan=pricing_plan,
+        )
+
+
+def _insert_returning(model, objs):
+    """INSERT objects in one statement and set their primary keys from it.
+
+    Django 3.2's ``bulk_create`` doesn't use ``RETURNING`` on SQLite.
+    """
+    pk = model._meta.pk
+    fields = [field for field in model._meta.concrete_fields if field != pk]
+    query = sql.InsertQuery(model)
+    query.insert_values(fields, objs)
+    [(insert_sql, params)] = query.get_compiler(connection=connection).as_sql()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"{insert_sql} RETURNING {connection.ops.quote_name(pk.column)}", params
+        )
+        rows = cursor.fetchall()
+    for obj, (value,) in zip(objs, rows):
+        obj.pk = value
+        obj._state.adding = False
+        obj._state.db = connection.alias
+
+
+def _bulk_create(model, objs, batch_size):
+    """bulk_create that always sets the primary keys of the created objects."""
+    if connection.features.can_return_rows_from_bulk_insert:
+        return model.objects.bulk_create(objs, batch_size=batch_size)
+    if (
+        connection.vendor == "sqlite"
+        and connection.Database.sqlite_version_info >= SQLITE_RETURNING_VERSION
+    ):
+        fields = model._meta.concrete_fields
+        batch_size = min(batch_size, connection.ops.bulk_batch_size(fields, objs))
+        for i in range(0, len(objs), batch_size):
+            _insert_returning(model, objs[i : i + batch_size])
+        return objs
+    for obj in objs:
+        obj.save(force_insert=True, initial_creation=True)
+    return objs
+
+
+def _save_flightplans(flightplans, batch_size):
+    """INSERT unsaved flight plans and their sub-plans, a few queries per table."""
+    _bulk_create(AirportPlan, [fp.airport_plan for fp in flightplans], batch_size)
+    _bulk_create(AircraftPlan, [fp.aircraft_plan for fp in flightplans], batch_size)
+    _bulk_create(PricingPlan, [fp.pricing_plan for fp in flightplans], batch_size)
+    return FlightPlan.objects.bulk_create(flightplans, batch_size=batch_size)
+
+
+def bulk_create_flightplans(
+    users_and_save_names, template=None, batch_size=500, ignore_limit=False
+):
+    """Create many flight plans with a few INSERTs per table in one transaction.
+
+    ``users_and_save_names`` is an iterable of (user, save name) pairs. If a
+    ``template`` flight plan is given, its airport, aircraft and pricing details
+    are copied into every new flight plan, otherwise they are left empty.
+    Raises ``FlightPlanLimitError`` if any user would go over the limit, unless
+    ``ignore_limit`` is true.
+    """
+    users_and_save_names = list(users_and_save_names)
+    count = len(users_and_save_names)
+    if template is not None:
+        airport_plan = template.airport_plan
+        aircraft_plan = template.aircraft_plan
+        pricing_plan = template.pricing_plan
+        airport_plans = [
+            AirportPlan(
+                uk_airport=airport_plan.uk_airport,
+                foreign_airport_id=airport_plan.foreign_airport_id,
+                distance=airport_plan.distance,
+            )
+            for _ in range(count)
+        ]
+        aircraft_plans = [
+            AircraftPlan(
+                aircraft_id=aircraft_plan.aircraft_id,
+                num_first_class=aircraft_plan.num_first_class,
+                num_standard_class=aircraft_plan.num_standard_class,
+            )
+            for _ in range(count)
+        ]
+        pricing_plans = [
+            PricingPlan(
+                standard_class_price=pricing_plan.standard_class_price,
+                first_class_price=pricing_plan.first_class_price,
+                cost_per_seat=pricing_plan.cost_per_seat,
+                running_cost=pricing_plan.running_cost,
+                income=pricing_plan.income,
+                profit=pricing_plan.profit,
+            )
+            for _ in range(count)
+        ]
+        is_complete = template.is_complete
+        route_summary_id = template.route_summary_id
+    else:
+        airport_plans = [AirportPlan() for _ in range(count)]
+        aircraft_plans = [AircraftPlan() for _ in range(count)]
+        pricing_plans = [PricingPlan() for _ in range(count)]
+        is_complete = False
+        route_summary_id = None
+
+    flightplans = [
+        FlightPlan(
+            save_name=save_name,
+            user=user,
+            airport_plan=airport_plan,
+            aircraft_plan=aircraft_plan,
+            pricing_plan=pricing_plan,
+            is_complete=is_complete,
+            route_summary_id=route_summary_id,
+        )
+        for (user, save_name), airport_plan, aircraft_plan, pricing_plan in zip(
+            users_and_save_names, airport_plans, aircraft_plans, pricing_plans
+        )
+    ]
+    with transaction.atomic():
+        if not ignore_limit:
+            check_flightplan_limits(user for user, _ in users_and_save_names)
+        if route_summary_id is not None:
+            summary_changes = SummaryChanges()
+            summary_changes.add(
+                route_summary_id, get_values(template.pricing_plan), count=count
+            )
+            summary_changes.apply()
+        return _save_flightplans(flightplans, batch_size)
+
+
+def _import_batch(flightplans, batch_size):
+    summary_changes = SummaryChanges()
+    for fp in flightplans:
+        summary_changes.move(fp, fp.pricing_plan, fp.is_complete)
+    summary_changes.apply()
+    return _save_flightplans(flightplans, batch_size)
+
+
+def import_flightplans(flightplans, batch_size=500, user=None):
+    """Save flight plans built in memory, with one transaction per batch.
+
+    The flight plans and their sub-plans must not have been saved yet, and
+    ``is_complete`` must already be worked out (see ``imports``). Each batch
+    is added to the route summary as it is saved. If ``user`` is given, they
+    are all saved in one transaction that first checks the user's limit.
+    """
+    if user is not None:
+        with transaction.atomic():
+            check_flightplan_limit(user, len(flightplans))
+            return _import_batch(flightplans, batch_size)
+    created = []
+    for i in range(0, len(flightplans), batch_size):
+        with transaction.atomic():
+            created += _import_batch(flightplans[i : i + batch_size], batch_size)
+    return created
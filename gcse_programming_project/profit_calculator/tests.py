@@ -1,3 +1,1095 @@
-from django.test import TestCase
+"""Performance regression tests.
 
-# Create your tests here.
+Every view in ``urls.py`` is requested with the test client against a database
+of realistic users and flight plans, and has to stay within a budget of SQL
+queries and a latency threshold. The import command and the save cascade are
+also timed on large inputs. The latency thresholds are generous so the tests
+don't fail on a slow machine - the query budgets are the main check.
+
+The price optimiser and sensitivity analysis are also checked against a brute
+force evaluation of small grids.
+"""
+
+import csv
+import gzip
+import io
+import json
+import os
+import random
+import tempfile
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Count, Sum
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.client import MULTIPART_CONTENT, encode_multipart
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import instrumentation
+from . import urls as app_urls
+from .analytics import TOTAL_FIELDS
+from .calculations import (
+    break_even_contour,
+    calculate_break_even_price,
+    calculate_cost_per_seat,
+    calculate_num_standard_class,
+    calculate_profit,
+    first_class_range,
+    optimise_flightplan,
+    price_range,
+    sensitivity_surface,
+)
+from .exports import write_json
+from .models import Aircraft, Airport, FlightPlan, PricingPlan, RouteSummary
+from .propagation import propagate, propagate_deletion
+from .services import (
+    MAX_FLIGHTPLANS,
+    FlightPlanLimitError,
+    bulk_create_flightplans,
+    create_flightplan,
+)
+
+DATA_DIR = settings.BASE_DIR.parent
+NUM_USERS = 20
+FLIGHTPLANS_PER_USER = 10
+REPEATS = 3
+DEFAULT_MAX_LATENCY = 250  # ms
+TEST_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "shared": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "shared",
+    },
+}
+
+
+def measure(client, method, url, data=None, **kwargs):
+    """Request a URL and return (response, queries, best time in ms).
+
+    The first request warms up the caches and isn't timed. Each request's
+    changes are rolled back, so every repeat does the same work.
+    """
+    best = None
+    for i in range(REPEATS + 1):
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response = getattr(client, method)(url, data, **kwargs)
+                elapsed = (time.perf_counter() - start) * 1000
+            transaction.set_rollback(True)
+        if i and (best is None or elapsed < best):
+            best = elapsed
+    return response, len(queries), best
+
+
+def write_airports(path, count):
+    """Write a gzipped airport file with ``count`` random airports."""
+    rng = random.Random(count)
+    with gzip.open(path, "wt", newline="") as file:
+        writer = csv.writer(file)
+        for i in range(count):
+            code = "".join(chr(65 + (i // 26**j) % 26) for j in range(3)) + str(i)
+            writer.writerow(
+                [
+                    code,
+                    f"Airport {i}",
+                    round(rng.uniform(-60, 70), 4),
+                    round(rng.uniform(-180, 180), 4),
+                ]
+            )
+
+
+# Reads go to the default connection, as the read connection can't see the
+# data written inside each test's transaction (ReadDatabaseTests checks the
+# router instead). The caches are kept in memory so that nothing is left over
+# from other test runs, and sessions are only kept in the cache as every
+# measured request is rolled back.
+@override_settings(
+    DATABASE_ROUTERS=[],
+    PROPAGATE_IN_BACKGROUND=False,
+    SESSION_ENGINE="django.contrib.sessions.backends.cache",
+    CACHES=TEST_CACHES,
+)
+class PerformanceTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        out = io.StringIO()
+        call_command("import", "airport", DATA_DIR / "Airports.txt", "-y", stdout=out)
+        call_command("import", "aircraft", DATA_DIR / "Aircraft.txt", "-y", stdout=out)
+        users = [User(username=f"user{i}", password="unused") for i in range(NUM_USERS)]
+        User.objects.bulk_create(users)
+        users = list(User.objects.order_by("pk"))
+        cls.user = users[0]
+
+        template = create_flightplan(cls.user, "template")
+        airport_plan = template.airport_plan
+        airport_plan.uk_airport = "LPL"
+        airport_plan.foreign_airport_id = "ORY"
+        airport_plan.save()
+        aircraft_plan = template.aircraft_plan
+        aircraft_plan.aircraft_id = "Medium narrow body"
+        aircraft_plan.num_first_class = 10
+        aircraft_plan.save()
+        pricing_plan = template.pricing_plan
+        pricing_plan.standard_class_price = Decimal("100")
+        pricing_plan.first_class_price = Decimal("300")
+        pricing_plan.save()
+        template.refresh_from_db()
+        cls.flightplan = template
+
+        # Half of each user's flight plans are complete copies of the template.
+        bulk_create_flightplans(
+            [
+                (user, f"plan {i}")
+                for user in users
+                for i in range(FLIGHTPLANS_PER_USER // 2)
+            ],
+            template=template,
+        )
+        bulk_create_flightplans(
+            [
+                (user, f"empty plan {i}")
+                for user in users
+                for i in range(FLIGHTPLANS_PER_USER // 2 - (user == cls.user))
+            ]
+        )
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        self.client.force_login(self.user)
+        session = self.client.session
+        session["current_fp"] = self.flightplan.pk
+        session.save()
+
+    def assertPerformance(self, name, queries, latency, budget, max_latency):
+        self.assertLessEqual(
+            queries, budget, f"{name} made {queries} queries (budget {budget})"
+        )
+        self.assertLessEqual(
+            latency,
+            max_latency,
+            f"{name} took {latency:.1f}ms (threshold {max_latency}ms)",
+        )
+
+
+class ViewPerformanceTests(PerformanceTestCase):
+    def check_view(self, name, method="get", data=None, budget=0, **kwargs):
+        max_latency = kwargs.pop("max_latency", DEFAULT_MAX_LATENCY)
+        status = kwargs.pop("status", 302 if method == "post" else 200)
+        url = reverse(f"profit_calculator:{name}")
+        with self.subTest(view=name, method=method):
+            response, queries, latency = measure(
+                self.client, method, url, data, **kwargs
+            )
+            self.assertEqual(response.status_code, status)
+            self.assertPerformance(
+                f"{method.upper()} {name}", queries, latency, budget, max_latency
+            )
+
+    def test_pages(self):
+        self.check_view("index", budget=1)
+        self.check_view("flightplans", budget=4)
+        self.check_view("flightplans", data={"complete": "complete"}, budget=4)
+        self.check_view("airport_details", budget=2)
+        self.check_view("aircraft_details", budget=3)
+        self.check_view("pricing_details", budget=2)
+        self.check_view("profit_information", budget=2)
+        self.check_view("export", budget=1)
+        self.check_view("change_password", budget=1)
+
+    def test_import_button(self):
+        response = self.client.get(reverse("profit_calculator:flightplans"))
+        self.assertContains(response, 'data-bs-target="#import-modal"')
+        self.assertContains(response, 'id="import-modal"')
+
+    def get_flightplan_list(self, **data):
+        """The user's flight plans, in order, across every page of the list."""
+        response = self.client.get(reverse("profit_calculator:flightplans"), data)
+        self.assertEqual(response.status_code, 200)
+        return response, list(response.context["paginator"].object_list)
+
+    def test_sort_and_filter(self):
+        plans = FlightPlan.objects.filter(user=self.user)
+        complete = plans.filter(is_complete=True)
+        incomplete = plans.filter(is_complete=False)
+        # An incomplete plan's stored figures are stale, so must be ignored.
+        stale = incomplete.order_by("pk")[0]
+        PricingPlan.objects.filter(pk=stale.pricing_plan_id).update(
+            income=Decimal("2000000"), profit=Decimal("1000000")
+        )
+        best = complete.exclude(pk=self.flightplan.pk).order_by("pk")[0]
+        PricingPlan.objects.filter(pk=best.pricing_plan_id).update(
+            income=Decimal("100001"), profit=Decimal("100000")
+        )
+        self.assertTrue(complete.filter(pricing_plan__profit__gt=0).exists())
+
+        for sort in ["profit", "margin"]:
+            with self.subTest(sort=sort):
+                response, object_list = self.get_flightplan_list(sort=sort)
+                self.assertEqual(response.context["sort"], sort)
+                self.assertEqual(len(object_list), plans.count())
+                num_complete = complete.count()
+                self.assertTrue(
+                    all(fp.is_complete for fp in object_list[:num_complete])
+                )
+                self.assertFalse(
+                    any(fp.is_complete for fp in object_list[num_complete:])
+                )
+                self.assertEqual(object_list[0], best)
+                values = [getattr(fp, sort) for fp in object_list[:num_complete]]
+                self.assertEqual(values, sorted(values, reverse=True))
+                self.assertTrue(
+                    all(fp.profit is None for fp in object_list[num_complete:])
+                )
+
+        response, object_list = self.get_flightplan_list(profitable="1")
+        self.assertEqual(response.context["filters"], {"profitable": "1"})
+        self.assertNotIn(stale, object_list)
+        self.assertCountEqual(object_list, complete.filter(pricing_plan__profit__gt=0))
+        response, object_list = self.get_flightplan_list(
+            profitable="1", complete="incomplete"
+        )
+        self.assertEqual(object_list, [])
+
+        # Invalid sorts and filters are ignored rather than rejected.
+        _, default = self.get_flightplan_list()
+        self.assertEqual(default, list(plans.order_by("-created", "save_name")))
+        for sort in ["bogus", "-created", "profit__gt", ""]:
+            with self.subTest(sort=sort):
+                response, object_list = self.get_flightplan_list(
+                    sort=sort, profitable="yes", aircraft="bogus", origin="XXX"
+                )
+                self.assertEqual(response.context["sort"], "newest")
+                self.assertEqual(response.context["filters"], {})
+                self.assertEqual(object_list, default)
+
+    def test_conditional_requests(self):
+        for name in ["flightplans", "profit_information"]:
+            url = reverse(f"profit_calculator:{name}")
+            etag = self.client.get(url)["ETag"]
+            self.check_view(name, status=304, budget=2, HTTP_IF_NONE_MATCH=etag)
+            # The page's forms have the CSRF token, which changes on logging in.
+            csrf_cookie = self.client.cookies[settings.CSRF_COOKIE_NAME].value
+            self.client.cookies[settings.CSRF_COOKIE_NAME] = "a" * 64
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.client.cookies[settings.CSRF_COOKIE_NAME] = csrf_cookie
+
+    def test_json_views(self):
+        self.check_view(
+            "optimise",
+            data={
+                "standard_class_min": 50,
+                "standard_class_max": 500,
+                "standard_class_step": 10,
+                "first_class_min": 100,
+                "first_class_max": 1000,
+                "first_class_step": 20,
+            },
+            budget=2,
+            max_latency=2000,
+        )
+        grid = {
+            "standard_class_min": 0,
+            "standard_class_max": 100,
+            "standard_class_step": 10,
+            "first_class_min": 0,
+            "first_class_max": 100,
+            "first_class_step": 10,
+        }
+        url = reverse("profit_calculator:optimise")
+        result = self.client.get(url, grid).json()["result"]
+        self.assertNotIn("profit", result)
+        result = self.client.get(url, {**grid, "surface": "on"}).json()["result"]
+        self.assertEqual(len(result["profit"]), len(result["num_first_class"]))
+        response = self.client.get(url, {**grid, "standard_class_step": "0.01"})
+        self.assertEqual(response.status_code, 400)
+        self.check_view("sensitivity", budget=2)
+        self.check_view("airport_search", budget=3)
+        self.check_view("airport_search", data={"q": "par", "page": 1}, budget=3)
+        self.check_view(
+            "aircraft_ranking",
+            data={"uk_airport": "LPL", "foreign_airport": "ORY"},
+            budget=2,
+        )
+        scenario = {
+            "uk_airport": "BOH",
+            "foreign_airport": "MAD",
+            "aircraft": "Large narrow body",
+            "num_first_class": 20,
+            "standard_class_price": "120",
+            "first_class_price": "400",
+        }
+        self.check_view(
+            "profit_calculation",
+            "post",
+            json.dumps({"scenarios": [scenario] * 1000}),
+            content_type="application/json",
+            status=200,
+            budget=4,
+            max_latency=1000,
+        )
+        self.user.is_staff = True
+        self.user.save()
+        self.check_view("metrics", budget=1)
+        self.check_view("analytics", budget=4)
+
+    def test_request_metrics(self):
+        instrumentation.reset()
+        response = self.client.post(
+            reverse("profit_calculator:export"), {"filetype": "json"}
+        )
+        # Streaming responses are only recorded once all of the content is sent.
+        self.assertNotIn("profit_calculator:export", instrumentation.snapshot())
+        b"".join(response.streaming_content)
+        stats = instrumentation.snapshot()["profit_calculator:export"]
+        self.assertEqual(stats["requests"], 1)
+        self.assertGreater(stats["queries"]["max"], 0)
+
+    async def test_async_request_metrics(self):
+        # The middleware runs in the event loop and the view in a thread.
+        self.async_client.cookies = self.client.cookies
+        response = await self.async_client.get(reverse("profit_calculator:flightplans"))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('desc="0 queries"', response["Server-Timing"])
+
+    def test_missing_current_flightplan(self):
+        # e.g. the flight plan was deleted in another session
+        missing = FlightPlan.objects.order_by("-pk")[0].pk + 1
+        for name in ["profit_information", "optimise"]:
+            session = self.client.session
+            session["current_fp"] = missing
+            session.save()
+            response = self.client.get(reverse(f"profit_calculator:{name}"))
+            self.assertRedirects(
+                response,
+                reverse("profit_calculator:flightplans"),
+                fetch_redirect_response=False,
+            )
+            self.assertNotIn("current_fp", self.client.session)
+
+    def test_invalid_input(self):
+        # Lists and dicts in JSON are rejected like any other invalid choice.
+        scenario = {
+            "uk_airport": "LPL",
+            "foreign_airport": {"code": "ORY"},
+            "aircraft": ["Medium narrow body"],
+            "num_first_class": 10,
+            "standard_class_price": "100",
+            "first_class_price": "300",
+        }
+        response = self.client.post(
+            reverse("profit_calculator:profit_calculation"),
+            json.dumps({"scenarios": [scenario]}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        result = response.json()["results"][0]
+        self.assertFalse(result["success"])
+        self.assertEqual(set(result["errors"]), {"foreign_airport", "aircraft"})
+
+        flightplan = {
+            "save_name": "invalid",
+            "airport_plan": {"uk_airport": "LPL", "foreign_airport": {"code": "ORY"}},
+            "aircraft_plan": {
+                "aircraft": ["Medium narrow body"],
+                "num_first_class": 10,
+            },
+        }
+        file = io.BytesIO(json.dumps([flightplan]).encode())
+        file.name = "flightplans.json"
+        count = FlightPlan.objects.count()
+        response = self.client.post(
+            reverse("profit_calculator:import_flightplans"), {"file": file}
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(FlightPlan.objects.count(), count)
+
+    def test_forms(self):
+        self.check_view(
+            "airport_details",
+            "post",
+            {"uk_airport": "BOH", "foreign_airport": "AMS"},
+            budget=13,
+        )
+        self.check_view(
+            "aircraft_details",
+            "post",
+            {"aircraft": "Large narrow body", "num_first_class": 20},
+            budget=13,
+        )
+        self.check_view(
+            "pricing_details",
+            "post",
+            {"standard_class_price": "150", "first_class_price": "450"},
+            budget=7,
+        )
+        self.check_view("export", "post", {"filetype": "json"}, status=200, budget=1)
+
+    def test_flightplan_management(self):
+        other = FlightPlan.objects.filter(user=self.user).exclude(
+            pk=self.flightplan.pk
+        )[0]
+        self.check_view(
+            "flightplans", "post", {"selected-fp": other.pk}, status=200, budget=1
+        )
+        self.check_view("create_flightplan", "post", {"save-name": "new"}, budget=12)
+        self.check_view(
+            "update_flightplan",
+            "post",
+            {"selected-fp": other.pk, "save-name": "renamed"},
+            budget=4,
+        )
+        self.check_view(
+            "delete_flightplan", "post", {"selected-fp": other.pk}, budget=3
+        )
+
+    def test_import_flightplans(self):
+        content = "".join(write_json(FlightPlan.objects.filter(user=self.user)))
+        file = io.BytesIO(content.encode())
+        file.name = "flightplans.json"
+        # Encoded up front as the test client can only read the file once.
+        data = encode_multipart("boundary", {"file": file})
+        content_type = f"{MULTIPART_CONTENT}; boundary=boundary"
+        self.check_view(
+            "import_flightplans", "post", data, content_type=content_type, budget=12
+        )
+        url = reverse("profit_calculator:import_flightplans")
+        self.client.post(url, data, content_type=content_type)
+        self.assertEqual(FlightPlan.objects.filter(user=self.user).count(), 20)
+
+    def test_flightplan_limit(self):
+        count = FlightPlan.objects.filter(user=self.user).count()
+        extra = [(self.user, f"extra {i}") for i in range(MAX_FLIGHTPLANS - count)]
+        with self.assertRaises(FlightPlanLimitError):
+            bulk_create_flightplans(extra + [(self.user, "one too many")])
+        self.assertEqual(FlightPlan.objects.filter(user=self.user).count(), count)
+        bulk_create_flightplans(extra)
+        with self.assertRaisesMessage(CommandError, "--ignore-limit"):
+            call_command("seedflightplans", "-n", "seeded", self.user.username)
+
+        content = "".join(write_json(FlightPlan.objects.filter(pk=self.flightplan.pk)))
+        file = io.BytesIO(content.encode())
+        file.name = "flightplans.json"
+        response = self.client.post(
+            reverse("profit_calculator:import_flightplans"), {"file": file}
+        )
+        self.assertRedirects(response, reverse("profit_calculator:flightplans"))
+        self.assertEqual(
+            FlightPlan.objects.filter(user=self.user).count(), MAX_FLIGHTPLANS
+        )
+        call_command(
+            "seedflightplans",
+            "-n",
+            "seeded",
+            "--ignore-limit",
+            self.user.username,
+            stdout=io.StringIO(),
+        )
+        self.assertEqual(
+            FlightPlan.objects.filter(user=self.user).count(), MAX_FLIGHTPLANS + 1
+        )
+
+    def assertSummaryMatches(self, operation):
+        expected = {
+            RouteSummary.get_key(origin, destination, aircraft): totals
+            for origin, destination, aircraft, *totals in FlightPlan.objects.filter(
+                is_complete=True
+            )
+            .values_list(
+                "airport_plan__uk_airport",
+                "airport_plan__foreign_airport",
+                "aircraft_plan__aircraft",
+            )
+            .annotate(
+                Count("pk"),
+                Sum("pricing_plan__profit"),
+                Sum("pricing_plan__income"),
+                Sum("pricing_plan__standard_class_price"),
+                Sum("pricing_plan__first_class_price"),
+            )
+            .order_by()
+        }
+        fields = ["num_flightplans"] + TOTAL_FIELDS
+        actual = {
+            key: totals
+            for key, *totals in RouteSummary.objects.values_list("key", *fields)
+            if any(totals)
+        }
+        self.assertTrue(expected)
+        self.assertEqual(actual, expected, f"Summary is wrong after {operation}")
+
+    def test_route_summary(self):
+        """The running totals match a full recalculation after every change."""
+        self.assertSummaryMatches("setup")
+        self.client.post(
+            reverse("profit_calculator:create_flightplan"), {"save-name": "new"}
+        )
+        new = FlightPlan.objects.get(user=self.user, save_name="new")
+        session = self.client.session
+        session["current_fp"] = new.pk
+        session.save()
+        for name, data in [
+            ("airport_details", {"uk_airport": "BOH", "foreign_airport": "AMS"}),
+            (
+                "aircraft_details",
+                {"aircraft": "Large narrow body", "num_first_class": 20},
+            ),
+            (
+                "pricing_details",
+                {"standard_class_price": "150", "first_class_price": "450"},
+            ),
+        ]:
+            self.client.post(reverse(f"profit_calculator:{name}"), data)
+        self.assertTrue(FlightPlan.objects.get(pk=new.pk).is_complete)
+        self.assertSummaryMatches("create")
+
+        for name, data in [
+            (
+                "pricing_details",
+                {"standard_class_price": "99.99", "first_class_price": "300"},
+            ),
+            ("airport_details", {"uk_airport": "LPL", "foreign_airport": "ORY"}),
+        ]:
+            self.client.post(reverse(f"profit_calculator:{name}"), data)
+            self.assertSummaryMatches(f"editing {name}")
+
+        other = FlightPlan.objects.filter(user=self.user, is_complete=True).exclude(
+            pk=new.pk
+        )[0]
+        self.client.post(
+            reverse("profit_calculator:delete_flightplan"), {"selected-fp": other.pk}
+        )
+        self.assertFalse(FlightPlan.objects.filter(pk=other.pk).exists())
+        self.assertSummaryMatches("delete")
+
+        users = User.objects.exclude(pk=self.user.pk)[:3]
+        bulk_create_flightplans(
+            [(user, "bulk") for user in users],
+            template=FlightPlan.objects.get(pk=new.pk),
+        )
+        self.assertSummaryMatches("bulk create")
+
+        content = "".join(write_json(FlightPlan.objects.filter(user=self.user)))
+        file = io.BytesIO(content.encode())
+        file.name = "flightplans.json"
+        count = FlightPlan.objects.count()
+        self.client.post(
+            reverse("profit_calculator:import_flightplans"), {"file": file}
+        )
+        self.assertGreater(FlightPlan.objects.count(), count)
+        self.assertSummaryMatches("import")
+
+    def test_accounts(self):
+        self.check_view("logout", status=302, budget=0)
+        self.client.logout()
+        self.check_view("login", budget=0)
+        self.check_view("signup", budget=0)
+        self.check_view(
+            "signup",
+            "post",
+            {
+                "username": "newuser",
+                "password1": "a-long-password-123",
+                "password2": "a-long-password-123",
+            },
+            budget=2,
+            max_latency=1000,
+        )
+        User.objects.create_user("loginuser", password="a-long-password-123")
+        self.check_view(
+            "login",
+            "post",
+            {"username": "loginuser", "password": "a-long-password-123"},
+            budget=2,
+            max_latency=1000,
+        )
+
+
+class BulkPerformanceTests(PerformanceTestCase):
+    def test_import(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "airports.csv.gz")
+            write_airports(path, 5000)
+            for description, max_latency in [("new", 15000), ("unchanged", 5000)]:
+                with self.subTest(airports=description):
+                    start = time.perf_counter()
+                    call_command("import", "airport", path, "-y", stdout=io.StringIO())
+                    latency = (time.perf_counter() - start) * 1000
+                    self.assertLessEqual(
+                        latency,
+                        max_latency,
+                        f"Importing {description} airports took {latency:.0f}ms",
+                    )
+        self.assertEqual(Airport.objects.count(), 5000)
+
+    def test_import_invalid_coordinates(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "airports.csv")
+            for row in ["NEW,New,91,0", "NEW,New,0,-180.5", "NEW,New,nan,0"]:
+                with open(path, "w") as file:
+                    file.write(f"CDG,Paris Charles de Gaulle,49.0,2.5\n{row}\n")
+                with self.subTest(row=row):
+                    with self.assertRaisesMessage(CommandError, "Line 2 "):
+                        call_command(
+                            "import", "airport", path, "-y", stdout=io.StringIO()
+                        )
+        self.assertFalse(Airport.objects.filter(code="NEW").exists())
+
+    def test_flightplan_import(self):
+        user = User.objects.create(username="importer", password="unused")
+        count = FlightPlan.objects.count()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "flightplans.json")
+            with open(path, "w") as file:
+                file.writelines(write_json(FlightPlan.objects.all()))
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                call_command(
+                    "importflightplans", user.username, path, stdout=io.StringIO()
+                )
+                latency = (time.perf_counter() - start) * 1000
+        self.assertPerformance("Flight plan import", len(queries), latency, 16, 5000)
+        self.assertEqual(FlightPlan.objects.filter(user=user).count(), count)
+        self.assertEqual(
+            FlightPlan.objects.filter(user=user, is_complete=True).count(),
+            FlightPlan.objects.filter(is_complete=True).count() // 2,
+        )
+        # Each flight plan is linked to the sub-plans that were built for it.
+        self.assertEqual(
+            PricingPlan.objects.filter(
+                flightplan__user=user,
+                flightplan__is_complete=True,
+                profit__isnull=False,
+            ).count(),
+            FlightPlan.objects.filter(user=user, is_complete=True).count(),
+        )
+
+    def test_import_propagation(self):
+        # Doubling every running cost recalculates every complete flight plan.
+        cost_per_seat = self.flightplan.pricing_plan.cost_per_seat
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "aircraft.csv")
+            with open(path, "w", newline="") as file:
+                writer = csv.writer(file)
+                for aircraft in Aircraft.objects.all():
+                    writer.writerow(
+                        [
+                            aircraft.type,
+                            aircraft.running_cost * 2,
+                            aircraft.range,
+                            aircraft.max_standard_class,
+                            aircraft.min_first_class,
+                        ]
+                    )
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                call_command("import", "aircraft", path, "-y", stdout=io.StringIO())
+                latency = (time.perf_counter() - start) * 1000
+        self.assertPerformance("Aircraft import", len(queries), latency, 40, 5000)
+        self.assertEqual(
+            PricingPlan.objects.filter(cost_per_seat=cost_per_seat * 2).count(),
+            FlightPlan.objects.filter(is_complete=True).count(),
+        )
+
+    def test_pricing_plan_update(self):
+        flightplans = list(
+            FlightPlan.objects.filter(is_complete=True).select_related(
+                "airport_plan__foreign_airport",
+                "aircraft_plan__aircraft",
+                "pricing_plan",
+            )
+        )
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            for fp in flightplans:
+                fp.pricing_plan.update()
+            latency = (time.perf_counter() - start) * 1000
+        # Nothing has changed, so nothing should be written.
+        self.assertPerformance(
+            f"Updating {len(flightplans)} pricing plans", len(queries), latency, 0, 1000
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            for fp in flightplans:
+                fp.pricing_plan.standard_class_price += 1
+                fp.pricing_plan.save()
+            latency = (time.perf_counter() - start) * 1000
+        self.assertPerformance(
+            f"Saving {len(flightplans)} pricing plans",
+            len(queries),
+            latency,
+            len(flightplans) * 5,
+            5000,
+        )
+
+    def test_propagation(self):
+        start = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            count = propagate(aircraft=["Medium narrow body"])
+        latency = (time.perf_counter() - start) * 1000
+        self.assertEqual(count, FlightPlan.objects.filter(is_complete=True).count())
+        self.assertPerformance("Propagation", len(queries), latency, 12, 2000)
+
+    def test_deletion_propagation(self):
+        flightplans = FlightPlan.objects.filter(is_complete=True)
+        count = flightplans.count()
+        start = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            with propagate_deletion(aircraft=["Medium narrow body"]):
+                Aircraft.objects.filter(pk="Medium narrow body").delete()
+        latency = (time.perf_counter() - start) * 1000
+        self.assertPerformance("Deletion propagation", len(queries), latency, 20, 2000)
+        # Every complete flight plan used the deleted aircraft.
+        self.assertFalse(flightplans.exists())
+        self.assertFalse(PricingPlan.objects.filter(profit__isnull=False).exists())
+        self.assertEqual(FlightPlan.objects.filter(version__gt=1).count(), count)
+
+
+class MigrationTests(TransactionTestCase):
+    def migrate(self, name):
+        executor = MigrationExecutor(connection)
+        executor.migrate([("profit_calculator", name)])
+        return executor.loader.project_state(("profit_calculator", name)).apps
+
+    def test_routes_round_trip(self):
+        latest = MigrationExecutor(connection).loader.graph.leaf_nodes(
+            "profit_calculator"
+        )
+        try:
+            apps = self.migrate("0003_referencedataversion")
+            apps.get_model("profit_calculator", "Airport").objects.create(
+                code="ORY",
+                name="Paris Orly",
+                distance_from_lpl=722,
+                distance_from_boh=487,
+            )
+            apps = self.migrate("0004_routes")
+            Route = apps.get_model("profit_calculator", "Route")
+            self.assertEqual(
+                dict(Route.objects.values_list("origin", "distance")),
+                {"LPL": 722, "BOH": 487},
+            )
+            apps = self.migrate("0003_referencedataversion")
+            airport = apps.get_model("profit_calculator", "Airport").objects.get()
+            self.assertEqual(
+                (airport.distance_from_lpl, airport.distance_from_boh), (722, 487)
+            )
+        finally:
+            MigrationExecutor(connection).migrate(latest)
+
+
+class CalculationTests(SimpleTestCase):
+    """The optimiser and sensitivity analysis against brute force on small grids."""
+
+    aircraft = Aircraft(
+        type="Test",
+        running_cost=Decimal("8"),
+        range=2650,
+        max_standard_class=40,
+        min_first_class=2,
+    )
+    distance = 722
+    standard_prices = price_range(Decimal("20"), Decimal("120"), Decimal("12.5"))
+    first_prices = price_range(Decimal("0"), Decimal("300"), Decimal("37.5"))
+
+    def brute_force(self, cost_per_seat):
+        results = {}
+        for num_first_class in first_class_range(self.aircraft):
+            num_standard_class = calculate_num_standard_class(
+                self.aircraft.max_standard_class, num_first_class
+            )
+            for standard_price in self.standard_prices:
+                for first_price in self.first_prices:
+                    results[num_first_class, standard_price, first_price] = (
+                        calculate_profit(
+                            cost_per_seat,
+                            num_first_class,
+                            num_standard_class,
+                            first_price,
+                            standard_price,
+                        )[2]
+                    )
+        return results
+
+    def test_optimise_flightplan(self):
+        cost_per_seat = calculate_cost_per_seat(
+            self.aircraft.running_cost, self.distance
+        )
+        profits = self.brute_force(cost_per_seat)
+        result = optimise_flightplan(
+            self.aircraft,
+            self.distance,
+            self.standard_prices,
+            self.first_prices,
+            include_surface=True,
+        )
+        best = result["best"]
+        self.assertEqual(
+            best["profit"], max(profits.values()).quantize(Decimal("0.01"))
+        )
+        key = (
+            best["num_first_class"],
+            best["standard_class_price"],
+            best["first_class_price"],
+        )
+        self.assertEqual(profits[key].quantize(Decimal("0.01")), best["profit"])
+        self.assertEqual(best["income"] - best["running_cost"], best["profit"])
+        for price in [best["standard_class_price"], best["first_class_price"]]:
+            self.assertEqual(price, price.quantize(Decimal("0.01")))
+            self.assertEqual(price.as_tuple().exponent, -2)
+        for i, num_first_class in enumerate(result["num_first_class"]):
+            for j, standard_price in enumerate(self.standard_prices):
+                for k, first_price in enumerate(self.first_prices):
+                    self.assertEqual(
+                        result["profit"][i][j][k],
+                        profits[num_first_class, standard_price, first_price].quantize(
+                            Decimal("0.01")
+                        ),
+                    )
+        result = optimise_flightplan(
+            self.aircraft, self.distance, self.standard_prices, self.first_prices
+        )
+        self.assertEqual(result["best"], best)
+        self.assertNotIn("profit", result)
+
+    def test_sensitivity(self):
+        cost_per_seat = calculate_cost_per_seat(
+            self.aircraft.running_cost, self.distance
+        )
+        num_first_class = 6
+        num_standard_class = calculate_num_standard_class(
+            self.aircraft.max_standard_class, num_first_class
+        )
+        factors = [Decimal("0.9"), Decimal(1), Decimal("1.1")]
+        surface = sensitivity_surface(
+            cost_per_seat,
+            num_first_class,
+            num_standard_class,
+            self.standard_prices,
+            self.first_prices,
+            factors,
+        )
+        for factor, rows in zip(factors, surface):
+            running_cost = (
+                cost_per_seat * (num_first_class + num_standard_class) * factor
+            )
+            for standard_price, row in zip(self.standard_prices, rows):
+                for first_price, profit in zip(self.first_prices, row):
+                    income = (
+                        num_standard_class * standard_price
+                        + num_first_class * first_price
+                    )
+                    self.assertEqual(profit, income - running_cost)
+            points = break_even_contour(
+                running_cost,
+                num_first_class,
+                num_standard_class,
+                self.standard_prices,
+                self.first_prices,
+            )
+            self.assertTrue(points)
+            for standard_price, first_price in points:
+                profit = (
+                    num_standard_class * standard_price
+                    + num_first_class * first_price
+                    - running_cost
+                )
+                # The first class price is rounded to the nearest penny.
+                self.assertLessEqual(abs(profit), num_first_class * Decimal("0.005"))
+
+    def test_break_even_price(self):
+        cost_per_seat = calculate_cost_per_seat(
+            self.aircraft.running_cost, self.distance
+        )
+        for num_first_class in first_class_range(self.aircraft):
+            price = calculate_break_even_price(
+                cost_per_seat, self.aircraft.max_standard_class, num_first_class
+            )
+            num_standard_class = calculate_num_standard_class(
+                self.aircraft.max_standard_class, num_first_class
+            )
+            profit = calculate_profit(
+                cost_per_seat, num_first_class, num_standard_class, price * 2, price
+            )[2]
+            self.assertAlmostEqual(profit, 0, places=10)
+
+
+class AccessPolicyTests(PerformanceTestCase):
+    """Every URL in ``urls.py`` is declared with the access policy it needs."""
+
+    public_urls = ["login", "logout", "signup"]
+    login_urls = [
+        "change_password",
+        "flightplans",
+        "create_flightplan",
+        "import_flightplans",
+        "update_flightplan",
+        "delete_flightplan",
+        "profit_calculation",
+        "analytics",
+        "metrics",
+    ]
+    flightplan_urls = [
+        "index",
+        "airport_details",
+        "airport_search",
+        "aircraft_ranking",
+        "aircraft_details",
+        "pricing_details",
+        "optimise",
+        "profit_information",
+        "sensitivity",
+        "export",
+    ]
+
+    def get(self, name):
+        return self.client.get(reverse(f"profit_calculator:{name}"))
+
+    def set_current_flightplan(self, pk):
+        session = self.client.session
+        if pk is None:
+            session.pop("current_fp", None)
+        else:
+            session["current_fp"] = pk
+        session.save()
+
+    def test_every_url_is_listed(self):
+        self.assertCountEqual(
+            [pattern.name for pattern in app_urls.urlpatterns],
+            self.public_urls + self.login_urls + self.flightplan_urls,
+        )
+
+    def test_anonymous(self):
+        self.client.logout()
+        for name in self.login_urls + self.flightplan_urls:
+            with self.subTest(url=name):
+                url = reverse(f"profit_calculator:{name}")
+                self.assertRedirects(
+                    self.client.get(url),
+                    f"{reverse('profit_calculator:login')}?next={url}",
+                    fetch_redirect_response=False,
+                )
+        for name in ["login", "signup"]:
+            with self.subTest(url=name):
+                self.assertEqual(self.get(name).status_code, 200)
+        self.assertEqual(self.client.get("/favicon.ico").status_code, 301)
+        # The admin site redirects to its own login page.
+        response = self.client.get("/admin/")
+        self.assertRedirects(
+            response, "/admin/login/?next=/admin/", fetch_redirect_response=False
+        )
+
+    def test_no_current_flightplan(self):
+        self.set_current_flightplan(None)
+        for name in self.flightplan_urls:
+            with self.subTest(url=name):
+                self.assertRedirects(
+                    self.get(name),
+                    reverse("profit_calculator:flightplans"),
+                    fetch_redirect_response=False,
+                )
+        for name in self.login_urls:
+            with self.subTest(url=name):
+                response = self.get(name)
+                if response.status_code == 302:
+                    self.assertNotIn(
+                        response.url,
+                        [
+                            reverse("profit_calculator:login"),
+                            reverse("profit_calculator:flightplans"),
+                        ],
+                    )
+
+    def test_stale_current_flightplan(self):
+        # Pages that don't use the flight plan itself aren't held up checking it.
+        unused = ["index", "export"]
+        missing = FlightPlan.objects.order_by("-pk")[0].pk + 1
+        for name in self.flightplan_urls:
+            with self.subTest(url=name):
+                self.set_current_flightplan(missing)
+                # The test client would re-raise NoCurrentFlightplan.
+                response = self.get(name)
+                if name in unused:
+                    self.assertEqual(response.status_code, 200)
+                else:
+                    self.assertRedirects(
+                        response,
+                        reverse("profit_calculator:flightplans"),
+                        fetch_redirect_response=False,
+                    )
+                    self.assertNotIn("current_fp", self.client.session)
+
+
+@override_settings(
+    PROPAGATE_IN_BACKGROUND=False,
+    SESSION_ENGINE="django.contrib.sessions.backends.cache",
+    CACHES=TEST_CACHES,
+)
+class ReadDatabaseTests(TransactionTestCase):
+    """The read-only views use the read connection when the router is enabled.
+
+    The read connection (a test mirror of the default one) can only see data
+    that has been committed, so this can't run in a transaction like the others.
+    """
+
+    databases = {"default", "read"}
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        out = io.StringIO()
+        call_command("import", "airport", DATA_DIR / "Airports.txt", "-y", stdout=out)
+        call_command("import", "aircraft", DATA_DIR / "Aircraft.txt", "-y", stdout=out)
+        self.user = User.objects.create_user("reader", password="unused")
+        self.flightplan = create_flightplan(self.user, "Mirrored plan")
+        self.client.force_login(self.user)
+        session = self.client.session
+        session["current_fp"] = self.flightplan.pk
+        session.save()
+
+    def test_router(self):
+        self.assertEqual(
+            settings.DATABASE_ROUTERS, ["profit_calculator.db.ReadWriteRouter"]
+        )
+        read = connections[settings.READ_DATABASE]
+        with CaptureQueriesContext(connection) as default_queries:
+            with CaptureQueriesContext(read) as read_queries:
+                response = self.client.get(reverse("profit_calculator:flightplans"))
+        self.assertContains(response, "Mirrored plan")
+        self.assertTrue(
+            any("profit_calculator_flightplan" in q["sql"] for q in read_queries)
+        )
+        self.assertFalse(
+            any("profit_calculator_flightplan" in q["sql"] for q in default_queries)
+        )
+
+        with CaptureQueriesContext(connection) as default_queries:
+            with CaptureQueriesContext(read) as read_queries:
+                response = self.client.post(
+                    reverse("profit_calculator:pricing_details"),
+                    {"standard_class_price": "150", "first_class_price": "450"},
+                )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len(read_queries), 0)
+        self.assertTrue(any(q["sql"].startswith("UPDATE") for q in default_queries))
+        self.assertEqual(
+            PricingPlan.objects.get(
+                pk=self.flightplan.pricing_plan_id
+            ).standard_class_price,
+            Decimal("150"),
+        )
@@ -1,37 +1,94 @@
 from django.urls import path
 
 from . import views
+from .access import public, requires_flightplan, requires_login
 
 app_name = "profit_calculator"
 urlpatterns = [
-    path("", views.IndexView.as_view(), name="index"),
-    path("login/", views.UserLoginView.as_view(), name="login"),
-    path("logout/", views.UserLogoutView.as_view(), name="logout"),
-    path("signup/", views.UserSignupView.as_view(), name="signup"),
-    path(
-        "change-password/",
-        views.UserPasswordChangeView.as_view(),
-        name="change_password",
-    ),
-    path("flightplans/", views.FlightPlanView.as_view(), name="flightplans"),
-    path(
-        "flightplans/create/",
-        views.CreateFlightPlan.as_view(),
-        name="create_flightplan",
-    ),
-    path(
-        "flightplans/update/",
-        views.UpdateFlightPlan.as_view(),
-        name="update_flightplan",
-    ),
-    path(
-        "flightplans/delete/",
-        views.DeleteFlightPlan.as_view(),
-        name="delete_flightplan",
-    ),
-    path("airport/", views.AirportView.as_view(), name="airport_details"),
-    path("aircraft/", views.AircraftView.as_view(), name="aircraft_details"),
-    path("pricing/", views.PricingView.as_view(), name="pricing_details"),
-    path("profit/", views.ProfitView.as_view(), name="profit_information"),
-    path("export/", views.ExportView.as_view(), name="export"),
+    requires_flightplan(path("", views.IndexView.as_view(), name="index")),
+    public(path("login/", views.UserLoginView.as_view(), name="login")),
+    public(path("logout/", views.UserLogoutView.as_view(), name="logout")),
+    public(path("signup/", views.UserSignupView.as_view(), name="signup")),
+    requires_login(
+        path(
+            "change-password/",
+            views.UserPasswordChangeView.as_view(),
+            name="change_password",
+        )
+    ),
+    requires_login(
+        path("flightplans/", views.FlightPlanView.as_view(), name="flightplans")
+    ),
+    requires_login(
+        path(
+            "flightplans/create/",
+            views.CreateFlightPlan.as_view(),
+            name="create_flightplan",
+        )
+    ),
+    requires_login(
+        path(
+            "flightplans/import/",
+            views.ImportFlightPlans.as_view(),
+            name="import_flightplans",
+        )
+    ),
+    requires_login(
+        path(
+            "flightplans/update/",
+            views.UpdateFlightPlan.as_view(),
+            name="update_flightplan",
+        )
+    ),
+    requires_login(
+        path(
+            "flightplans/delete/",
+            views.DeleteFlightPlan.as_view(),
+            name="delete_flightplan",
+        )
+    ),
+    requires_flightplan(
+        path("airport/", views.AirportView.as_view(), name="airport_details")
+    ),
+    requires_flightplan(
+        path(
+            "airport/search/", views.AirportSearchView.as_view(), name="airport_search"
+        )
+    ),
+    requires_flightplan(
+        path(
+            "airport/aircraft-ranking/",
+            views.AircraftRankingView.as_view(),
+            name="aircraft_ranking",
+        )
+    ),
+    requires_flightplan(
+        path("aircraft/", views.AircraftView.as_view(), name="aircraft_details")
+    ),
+    requires_flightplan(
+        path("pricing/", views.PricingView.as_view(), name="pricing_details")
+    ),
+    requires_flightplan(
+        path("pricing/optimise/", views.OptimiseView.as_view(), name="optimise")
+    ),
+    requires_flightplan(
+        path("profit/", views.ProfitView.as_view(), name="profit_information")
+    ),
+    requires_flightplan(
+        path(
+            "profit/sensitivity/",
+            views.SensitivityView.as_view(),
+            name="sensitivity",
+        )
+    ),
+    requires_flightplan(path("export/", views.ExportView.as_view(), name="export")),
+    requires_login(
+        path(
+            "api/profit/",
+            views.ProfitCalculationView.as_view(),
+            name="profit_calculation",
+        )
+    ),
+    requires_login(path("analytics/", views.AnalyticsView.as_view(), name="analytics")),
+    requires_login(path("metrics/", views.MetricsView.as_view(), name="metrics")),
 ]
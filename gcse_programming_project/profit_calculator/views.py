@@ -1,4 +1,8 @@
+import hashlib
 import io
+import json
+import os
+from urllib.parse import urlencode
 
 from django.conf import settings
 from django.contrib import messages
@@ -6,35 +10,97 @@ from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 from django.contrib.auth.views import LoginView, LogoutView, PasswordChangeView
 from django.contrib.messages.views import SuccessMessageMixin
-from django.core import serializers
+from django.core.cache import cache
 from django.core.exceptions import PermissionDenied
-from django.http import FileResponse, Http404, JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Count, F, Max
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.middleware.csrf import get_token
 from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse, reverse_lazy
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+    quote_etag,
+)
+from django.utils.decorators import method_decorator
+from django.utils.http import http_date
 from django.utils.safestring import mark_safe
 from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import DetailView, ListView, TemplateView
 from django.views.generic.detail import SingleObjectMixin
 from django.views.generic.edit import CreateView, UpdateView
 
-from .models import (Aircraft, AircraftPlan, Airport, AirportPlan, FlightPlan,
-                     PricingPlan)
+from . import analytics, exports, imports, instrumentation, navbar, reference
+from .calculations import (
+    TWO_PLACES,
+    break_even_contour,
+    first_class_range,
+    optimise_flightplan,
+    rank_aircraft,
+    sensitivity_surface,
+)
+from .db import read_only_database
+from .forms import (
+    AircraftPlanForm,
+    AirportPlanForm,
+    OptimiseForm,
+    ProfitScenarioForm,
+    RouteForm,
+    SensitivityForm,
+)
+from .middleware import (
+    NoCurrentFlightplan,
+    clear_flightplan_cache,
+    get_flightplan,
+    has_cached_flightplan,
+)
+from .models import (
+    AircraftPlan,
+    AirportPlan,
+    FlightPlan,
+    PricingPlan,
+    RouteFeasibility,
+)
+from .services import FlightPlanLimitError, create_flightplan, import_flightplans
+
+
+def is_current_flightplan_complete(request):
+    """Whether the current flight plan is complete, as shown in the navbar.
+
+    The flight plan is only loaded if the view hasn't loaded it already and the
+    value isn't cached.
+    """
+
+    def load():
+        fp = get_flightplan(request)
+        return fp.is_complete if fp is not None else False
+
+    if not request.user.is_authenticated or "current_fp" not in request.session:
+        return False
+    if has_cached_flightplan(request):
+        return load()
+    return navbar.get_cached_completeness(
+        request.user.pk, request.session["current_fp"], load
+    )
 
 
 def context_processor(request):
-    if "current_fp" in request.session:
-        try:
-            fp = get_current_flightplan(request)
-            complete = fp.complete()
-        except FlightPlan.DoesNotExist:
-            complete = False
-    else:
-        complete = False
-    return {"complete": complete, "breakpoint": settings.NAVBAR_BREAKPOINT}
+    return {
+        "complete": is_current_flightplan_complete(request),
+        "breakpoint": settings.NAVBAR_BREAKPOINT,
+        "fragment_cache_timeout": settings.FRAGMENT_CACHE_TIMEOUT,
+    }
 
 
 def get_current_flightplan(request):
-    return FlightPlan.objects.get(pk=request.session["current_fp"])
+    fp = get_flightplan(request)
+    if fp is None:
+        # Handled by AccessPolicyMiddleware, which clears the session key.
+        raise NoCurrentFlightplan("Current flight plan does not exist.")
+    return fp
 
 
 def get_user_flightplans(request):
@@ -43,6 +109,87 @@ def get_user_flightplans(request):
     )
 
 
+def get_completeness_filter(request):
+    complete = request.GET.get("complete", "")
+    return complete if complete in ["complete", "incomplete"] else ""
+
+
+def filter_by_completeness(queryset, complete):
+    if complete == "complete":
+        return queryset.filter(is_complete=True)
+    elif complete == "incomplete":
+        return queryset.filter(is_complete=False)
+    else:
+        return queryset
+
+
+FLIGHTPLAN_ORDERINGS = {
+    "newest": ("Newest first", ["-created", "save_name"]),
+    "name": ("Save name", ["save_name", "-created"]),
+    "profit": (
+        "Most profitable",
+        [F("profit").desc(nulls_last=True), "-created"],
+    ),
+    "margin": ("Highest margin", [F("margin").desc(nulls_last=True), "-created"]),
+    "route": ("Route", ["uk_airport", "foreign_airport", "-created"]),
+    "aircraft": ("Aircraft", ["aircraft", "-created"]),
+}
+
+
+def get_flightplan_sort(request):
+    sort = request.GET.get("sort", "")
+    return sort if sort in FLIGHTPLAN_ORDERINGS else "newest"
+
+
+def get_flightplan_filters(request):
+    """The valid route, aircraft and profit filters given in the query string."""
+    filters = {}
+    origin = request.GET.get("origin", "")
+    if origin in settings.ORIGIN_AIRPORTS:
+        filters["origin"] = origin
+    destination = request.GET.get("destination", "").strip().upper()
+    if destination:
+        filters["destination"] = destination[:3]
+    aircraft = request.GET.get("aircraft", "")
+    if reference.aircraft.get(aircraft) is not None:
+        filters["aircraft"] = aircraft
+    if request.GET.get("profitable") == "1":
+        filters["profitable"] = "1"
+    return filters
+
+
+def filter_flightplans(queryset, filters):
+    """Filter flight plans annotated with ``with_summary()``."""
+    if "origin" in filters:
+        queryset = queryset.filter(uk_airport=filters["origin"])
+    if "destination" in filters:
+        queryset = queryset.filter(foreign_airport=filters["destination"])
+    if "aircraft" in filters:
+        queryset = queryset.filter(aircraft=filters["aircraft"])
+    if "profitable" in filters:
+        # Filtered on the column rather than the ``profit`` annotation, which
+        # SQLite would compare as text.
+        queryset = queryset.filter(is_complete=True, pricing_plan__profit__gt=0)
+    return queryset
+
+
+class ReadOnlyDatabaseMixin:
+    """Run GET requests against the read database.
+
+    The response is rendered inside the block too, as the templates evaluate
+    most of the querysets.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            return super().dispatch(request, *args, **kwargs)
+        with read_only_database():
+            response = super().dispatch(request, *args, **kwargs)
+            if hasattr(response, "render"):
+                response.render()
+            return response
+
+
 class IndexView(TemplateView):
     template_name = "profit_calculator/misc/index.html"
 
@@ -78,16 +225,112 @@ class UserPasswordChangeView(SuccessMessageMixin, PasswordChangeView):
     success_message = "Password changed successfully."
 
 
-class FlightPlanView(ListView):
+class ConditionalGetMixin:
+    """Answer conditional GET requests with 304 Not Modified.
+
+    ``get_validators()`` returns the page's ETag and last modified time, either
+    of which can be None. Pages with messages waiting to be shown are always
+    rendered, as rendering them uses them up.
+
+    The pages have forms with the CSRF token in them, which changes when the
+    user logs in. So the ETag also depends on the token, and the page counts as
+    modified when the user last logged in.
+    """
+
+    def get_validators(self):
+        return None, None
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD") or len(messages.get_messages(request)):
+            return super().dispatch(request, *args, **kwargs)
+        etag, last_modified = self.get_validators()
+        if etag is None and last_modified is None:
+            return super().dispatch(request, *args, **kwargs)
+        if etag is not None:
+            get_token(request)
+            etag = hashlib.blake2b(
+                f"{etag}:{request.META['CSRF_COOKIE']}".encode(), digest_size=16
+            ).hexdigest()
+            etag = quote_etag(etag)
+        if last_modified is not None:
+            last_login = request.user.last_login
+            if last_login is not None and last_login > last_modified:
+                last_modified = last_login
+            last_modified = int(last_modified.timestamp())
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = super().dispatch(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            if etag is not None:
+                response.headers["ETag"] = etag
+            if last_modified is not None:
+                response.headers["Last-Modified"] = http_date(last_modified)
+            # Browsers must check with the server before reusing the page.
+            patch_cache_control(response, private=True, no_cache=True)
+            patch_vary_headers(response, ["Cookie"])
+        return response
+
+
+class FlightPlanView(ReadOnlyDatabaseMixin, ConditionalGetMixin, ListView):
     template_name = "profit_calculator/misc/flightplan_list.html"
     paginate_by = 5
 
+    def get_validators(self):
+        """Validators from the number of flight plans and when one last changed."""
+        latest = FlightPlan.objects.filter(user=self.request.user).aggregate(
+            count=Count("pk"), updated=Max("updated")
+        )
+        etag = hashlib.blake2b(
+            repr(
+                (
+                    self.request.user.pk,
+                    self.request.user.is_staff,
+                    self.request.session.get("current_fp"),
+                    latest["count"],
+                    latest["updated"],
+                    sorted(self.request.GET.lists()),
+                )
+            ).encode(),
+            digest_size=16,
+        ).hexdigest()
+        return etag, latest["updated"]
+
     def get_queryset(self):
-        return get_user_flightplans(self.request)
+        queryset = filter_by_completeness(
+            get_user_flightplans(self.request), get_completeness_filter(self.request)
+        ).with_summary()
+        queryset = filter_flightplans(queryset, get_flightplan_filters(self.request))
+        return queryset.order_by(
+            *FLIGHTPLAN_ORDERINGS[get_flightplan_sort(self.request)][1]
+        )
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        complete_filter = get_completeness_filter(self.request)
+        sort = get_flightplan_sort(self.request)
+        filters = get_flightplan_filters(self.request)
+        # Query strings that keep the other options when one is changed.
+        query = dict(filters, sort=sort) if sort != "newest" else dict(filters)
+        context["complete_filter"] = complete_filter
+        context["sort"] = sort
+        context["sort_options"] = [
+            (key, label) for key, (label, _) in FLIGHTPLAN_ORDERINGS.items()
+        ]
+        context["filters"] = filters
+        context["aircraft_choices"] = reference.aircraft.all()
+        context["origin_choices"] = settings.ORIGIN_AIRPORTS
+        context["filter_query"] = urlencode(query)
+        if complete_filter:
+            query["complete"] = complete_filter
+        context["page_query"] = urlencode(query)
+        return context
 
     def post(self, request):
         """Set session cookie with current flightplan."""
         request.session["current_fp"] = int(request.POST["selected-fp"])
+        clear_flightplan_cache(request)
         return JsonResponse({"success": True})
 
 
@@ -101,17 +344,12 @@ class CreateFlightPlan(View):
             return self.form_valid()
 
     def form_valid(self):
-        if FlightPlan.objects.filter(user=self.request.user).count() >= 25:
-            messages.error(
-                "You already have 25 flightplans. This is the maximum "
-                "allowed. Please delete at least one and then try again."
-            )
+        try:
+            fp = create_flightplan(self.request.user, self.request.POST["save-name"])
+        except FlightPlanLimitError as e:
+            messages.error(self.request, str(e))
             return redirect("profit_calculator:flightplans")
         else:
-            fp = FlightPlan(
-                save_name=self.request.POST["save-name"], user=self.request.user
-            )
-            fp.save()
             messages.success(
                 self.request, f'Flight plan "{fp.save_name}" created successfully.'
             )
@@ -126,6 +364,45 @@ class CreateFlightPlan(View):
         return redirect("profit_calculator:flightplans")
 
 
+class ImportFlightPlans(View):
+    """Create flight plans from a file downloaded from the export page."""
+
+    success_url = reverse_lazy("profit_calculator:flightplans")
+
+    def post(self, request):
+        upload = request.FILES.get("file")
+        filetype = upload and imports.EXTENSIONS.get(
+            os.path.splitext(upload.name)[1].lower()
+        )
+        if not filetype:
+            messages.error(
+                request, "Please choose a JSON, NDJSON, YAML or CSV file to import."
+            )
+            return redirect(self.success_url)
+        if upload.size > settings.FLIGHTPLAN_IMPORT_MAX_SIZE:
+            messages.error(request, "The file is too large to import.")
+            return redirect(self.success_url)
+        try:
+            with io.TextIOWrapper(
+                upload.file, encoding="utf-8-sig", newline=""
+            ) as file:
+                records = imports.read_flightplans(file, filetype)
+            flightplans = imports.build_flightplans(request.user, records)
+            # The limit is checked in the same transaction as the flight plans
+            # are saved in.
+            created = import_flightplans(flightplans, user=request.user)
+        except imports.FlightPlanImportError as e:
+            for error in e.errors:
+                messages.error(request, error)
+        except FlightPlanLimitError as e:
+            messages.error(request, str(e))
+        else:
+            messages.success(
+                request, f"{len(created)} flight plans imported successfully."
+            )
+        return redirect(self.success_url)
+
+
 class UpdateFlightPlan(SingleObjectMixin, View):
     success_url = reverse_lazy("profit_calculator:flightplans")
 
@@ -171,6 +448,7 @@ class DeleteFlightPlan(SingleObjectMixin, View):
             del request.session["current_fp"]
         except KeyError:
             pass
+        clear_flightplan_cache(request)
         messages.success(request, "Flight plan deleted successfully.")
         return redirect("profit_calculator:flightplans")
 
@@ -183,7 +461,7 @@ class DeleteFlightPlan(SingleObjectMixin, View):
 
 class AirportView(SuccessMessageMixin, UpdateView):
     model = AirportPlan
-    fields = ["uk_airport", "foreign_airport"]
+    form_class = AirportPlanForm
     template_name = "profit_calculator/forms/airportplan_form.html"
     success_url = reverse_lazy("profit_calculator:index")
     success_message = "Airport information submitted successfully."
@@ -195,7 +473,7 @@ class AirportView(SuccessMessageMixin, UpdateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context["airports"] = Airport.objects.all()
+        context["uk_airports"] = settings.ORIGIN_AIRPORTS
         return context
 
     def form_invalid(self, form):
@@ -203,9 +481,96 @@ class AirportView(SuccessMessageMixin, UpdateView):
         return super().form_invalid(form)
 
 
+class AirportSearchView(View):
+    """A page of the foreign airports matching the ``q`` parameter, as JSON.
+
+    Used by the airport form so that the page doesn't have to list every
+    airport. Each airport has the UK airports it is out of range of with the
+    current flight plan's aircraft, which are only greyed out as the aircraft can
+    be changed afterwards.
+    """
+
+    def get(self, request):
+        try:
+            page = int(request.GET.get("page", 1))
+        except ValueError:
+            page = 0
+        if page < 1:
+            return json_error("The page must be a positive whole number.")
+        page_size = settings.AIRPORT_SEARCH_PAGE_SIZE
+        airports = reference.airports.search(
+            request.GET.get("q", ""), (page - 1) * page_size, page_size + 1
+        )
+        has_next = len(airports) > page_size
+        airports = airports[:page_size]
+
+        out_of_range = {}
+        aircraft_id = get_current_flightplan(request).aircraft_plan.aircraft_id
+        if aircraft_id is not None and airports:
+            for origin, destination in RouteFeasibility.objects.filter(
+                aircraft=aircraft_id,
+                in_range=False,
+                destination__in=[airport.code for airport in airports],
+            ).values_list("origin", "destination"):
+                out_of_range.setdefault(destination, []).append(origin)
+        return JsonResponse(
+            {
+                "success": True,
+                "results": [
+                    {
+                        "code": airport.code,
+                        "name": airport.name,
+                        "out_of_range": out_of_range.get(airport.code, []),
+                    }
+                    for airport in airports
+                ],
+                "page": page,
+                "has_next": has_next,
+            }
+        )
+
+
+class AircraftRankingView(View):
+    """Every aircraft that can fly a route, ranked by the most profit it can make.
+
+    The route is given by the ``uk_airport`` and ``foreign_airport`` parameters
+    and the current flight plan's prices are used. Each aircraft's best number of
+    first class seats is returned as JSON.
+    """
+
+    def get(self, request):
+        pricing_plan = get_current_flightplan(request).pricing_plan
+        if not pricing_plan.details_exist():
+            return json_error(
+                "Pricing data must be submitted before aircraft can be ranked."
+            )
+        form = RouteForm(request.GET)
+        if not form.is_valid():
+            return JsonResponse(
+                {"success": False, "errors": form.errors.get_json_data()}, status=400
+            )
+        distance = form.cleaned_data["distance"]
+        return JsonResponse(
+            {
+                "success": True,
+                "result": {
+                    "distance": distance,
+                    "standard_class_price": pricing_plan.standard_class_price,
+                    "first_class_price": pricing_plan.first_class_price,
+                    "aircraft": rank_aircraft(
+                        reference.aircraft.all(),
+                        distance,
+                        pricing_plan.standard_class_price,
+                        pricing_plan.first_class_price,
+                    ),
+                },
+            }
+        )
+
+
 class AircraftView(SuccessMessageMixin, UpdateView):
     model = AircraftPlan
-    fields = ["aircraft", "num_first_class"]
+    form_class = AircraftPlanForm
     template_name = "profit_calculator/forms/aircraftplan_form.html"
     success_url = reverse_lazy("profit_calculator:index")
     success_message = "Aircraft information submitted successfully."
@@ -217,11 +582,21 @@ class AircraftView(SuccessMessageMixin, UpdateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context["aircrafts"] = Aircraft.objects.all()
+        aircrafts = reference.aircraft.all()
+        context["aircrafts"] = aircrafts
         context["aircraft_values"] = {
             aircraft.pk: [aircraft.max_standard_class, aircraft.min_first_class]
-            for aircraft in Aircraft.objects.all()
+            for aircraft in aircrafts
         }
+        airport_plan = self.object.flightplan.airport_plan
+        if airport_plan.details_exist():
+            context["out_of_range"] = set(
+                RouteFeasibility.objects.filter(
+                    origin=airport_plan.uk_airport,
+                    destination=airport_plan.foreign_airport_id,
+                    in_range=False,
+                ).values_list("aircraft", flat=True)
+            )
         return context
 
     def form_invalid(self, form):
@@ -290,7 +665,116 @@ class PricingView(SuccessMessageMixin, UpdateView):
         return super().form_invalid(form)
 
 
-class ProfitView(DetailView):
+class OptimiseView(View):
+    """Sweep seat configurations and prices for the current flight plan.
+
+    Nothing is saved - the best configuration is returned as JSON, along with
+    the profit surface if ``surface`` is given.
+    """
+
+    def get(self, request):
+        fp = get_current_flightplan(request)
+        airport_plan = fp.airport_plan
+        aircraft_plan = fp.aircraft_plan
+        if not airport_plan.details_exist() or aircraft_plan.aircraft is None:
+            return JsonResponse(
+                {
+                    "success": False,
+                    "errors": {
+                        "__all__": [
+                            "Airport and aircraft data must be submitted before "
+                            "optimising the flight plan."
+                        ]
+                    },
+                },
+                status=400,
+            )
+        if aircraft_plan.aircraft.range <= airport_plan.distance:
+            return JsonResponse(
+                {
+                    "success": False,
+                    "errors": {
+                        "__all__": [
+                            "This route is longer than the range of the aircraft "
+                            "selected."
+                        ]
+                    },
+                },
+                status=400,
+            )
+        form = OptimiseForm(
+            request.GET, layers=len(first_class_range(aircraft_plan.aircraft))
+        )
+        if not form.is_valid():
+            return JsonResponse(
+                {"success": False, "errors": form.errors.get_json_data()}, status=400
+            )
+        result = optimise_flightplan(
+            aircraft_plan.aircraft,
+            airport_plan.distance,
+            form.standard_class_prices(),
+            form.first_class_prices(),
+            include_surface=form.cleaned_data["surface"],
+        )
+        return JsonResponse({"success": result is not None, "result": result})
+
+
+def json_error(message, status=400):
+    return JsonResponse(
+        {"success": False, "errors": {"__all__": [message]}}, status=status
+    )
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class ProfitCalculationView(View):
+    """Work out the profit of a batch of scenarios without saving anything.
+
+    The request body is a JSON object with a ``scenarios`` list, each with the
+    fields of ``ProfitScenarioForm``. The results are returned in the same order,
+    with the errors instead for any invalid scenario. CSRF protection isn't
+    needed as nothing is changed.
+    """
+
+    def post(self, request):
+        try:
+            scenarios = json.loads(request.body)["scenarios"]
+        except (ValueError, TypeError, KeyError):
+            return json_error(
+                "The request body must be a JSON object with a list of scenarios."
+            )
+        if not isinstance(scenarios, list):
+            return json_error("The scenarios must be a list.")
+        max_scenarios = settings.PROFIT_CALCULATION_MAX_SCENARIOS
+        if len(scenarios) > max_scenarios:
+            return json_error(
+                f"Too many scenarios - there must be at most {max_scenarios}."
+            )
+
+        results = []
+        for scenario in scenarios:
+            if not isinstance(scenario, dict):
+                results.append(
+                    {
+                        "success": False,
+                        "errors": {
+                            "__all__": [
+                                {"message": "Invalid scenario.", "code": "invalid"}
+                            ]
+                        },
+                    }
+                )
+                continue
+            form = ProfitScenarioForm(scenario)
+            if form.is_valid():
+                results.append({"success": True, "result": form.calculate()})
+            else:
+                results.append(
+                    {"success": False, "errors": form.errors.get_json_data()}
+                )
+        return JsonResponse({"success": True, "results": results})
+
+
+class ProfitView(ReadOnlyDatabaseMixin, ConditionalGetMixin, DetailView):
     model = FlightPlan
     fields = ["airport_plan", "aircraft_plan", "pricing_plan"]
     template_name = "profit_calculator/misc/flightplan_detail.html"
@@ -308,6 +792,13 @@ class ProfitView(DetailView):
         else:
             return super().get(request, *args, **kwargs)
 
+    def get_validators(self):
+        fp = get_flightplan(self.request)
+        if fp is None or not fp.is_complete:
+            return None, None
+        user = self.request.user
+        return f"{user.pk}-{int(user.is_staff)}-{fp.pk}-{fp.version}", fp.updated
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context["profitable"] = self.object.pricing_plan.profitable()
@@ -317,7 +808,85 @@ class ProfitView(DetailView):
         return get_current_flightplan(self.request)
 
 
-class ExportView(ListView):
+def get_sensitivity(flightplan, standard_prices, first_prices, running_cost_factors):
+    """The profit and break-even contour for every combination of prices.
+
+    Results are cached under a key made from everything they depend on, so they
+    are only worked out again once the flight plan or the prices change.
+    """
+    aircraft_plan = flightplan.aircraft_plan
+    pricing_plan = flightplan.pricing_plan
+    inputs = (
+        pricing_plan.cost_per_seat,
+        aircraft_plan.num_first_class,
+        aircraft_plan.num_standard_class,
+        standard_prices,
+        first_prices,
+        running_cost_factors,
+    )
+    key = "sensitivity:" + hashlib.blake2b(repr(inputs).encode()).hexdigest()
+    result = cache.get(key)
+    if result is None:
+        surface = sensitivity_surface(*inputs)
+        result = {
+            "standard_class_prices": standard_prices,
+            "first_class_prices": first_prices,
+            "running_cost_factors": running_cost_factors,
+            "profit": [
+                [[profit.quantize(TWO_PLACES) for profit in row] for row in rows]
+                for rows in surface
+            ],
+            "break_even": [
+                [
+                    {"standard_class_price": standard, "first_class_price": first}
+                    for standard, first in break_even_contour(
+                        pricing_plan.running_cost * factor,
+                        aircraft_plan.num_first_class,
+                        aircraft_plan.num_standard_class,
+                        standard_prices,
+                        first_prices,
+                    )
+                ]
+                for factor in running_cost_factors
+            ],
+        }
+        cache.set(key, result, settings.SENSITIVITY_CACHE_TIMEOUT)
+    return result
+
+
+class SensitivityView(View):
+    """How the profit of the current flight plan changes with its prices.
+
+    The price ranges default to zero to double the current prices, and the
+    running cost can also be varied by a percentage either way.
+    """
+
+    def get(self, request):
+        fp = get_current_flightplan(request)
+        if not fp.is_complete:
+            return json_error(
+                "You must enter all the required data before analysing the profit."
+            )
+        form = SensitivityForm(
+            {
+                **SensitivityForm.get_default_data(fp.pricing_plan),
+                **request.GET.dict(),
+            }
+        )
+        if not form.is_valid():
+            return JsonResponse(
+                {"success": False, "errors": form.errors.get_json_data()}, status=400
+            )
+        result = get_sensitivity(
+            fp,
+            form.standard_class_prices(),
+            form.first_class_prices(),
+            form.running_cost_factors(),
+        )
+        return JsonResponse({"success": True, "result": result})
+
+
+class ExportView(ReadOnlyDatabaseMixin, ListView):
     template_name = "profit_calculator/misc/export.html"
 
     def get_queryset(self):
@@ -325,22 +894,77 @@ class ExportView(ListView):
 
     def post(self, request):
         self.object_list = self.get_queryset()
-        filetype = request.POST["filetype"]
-        if filetype in ["json", "xml", "yaml"]:
-            data = serializers.serialize(filetype, self.object_list)
-            file = io.BytesIO(data.encode())
-            if filetype == "json":
-                content_type = "application/json"
-            elif filetype == "xml":
-                content_type = "application/xml"
-            elif filetype == "yaml":
-                content_type = "application/yaml"
-            return FileResponse(
-                file,
-                as_attachment=True,
-                filename=f"flightplan.{filetype}",
-                content_type=content_type,
+        filetype = request.POST.get("filetype")
+        if filetype in exports.WRITERS:
+            content = exports.WRITERS[filetype](self.object_list)
+            if isinstance(request, ASGIRequest):
+                # Under ASGI, Django 3.2 iterates streaming responses in the event
+                # loop where the database can't be used, so the file is built here.
+                response = HttpResponse(
+                    "".join(content), content_type=exports.CONTENT_TYPES[filetype]
+                )
+            else:
+                response = StreamingHttpResponse(
+                    content, content_type=exports.CONTENT_TYPES[filetype]
+                )
+            response["Content-Disposition"] = (
+                f'attachment; filename="flightplan.{filetype}"'
             )
+            return response
         else:
-            messages.error("Invalid filetype.")
-            return redirect("profit_calculator/misc/export.html")
+            messages.error(request, "Invalid filetype.")
+            return redirect("profit_calculator:export")
+
+
+class AnalyticsView(TemplateView):
+    """Most and least profitable routes and aircraft across every flight plan.
+
+    The figures come from the running totals in the route summary table.
+    """
+
+    template_name = "profit_calculator/misc/analytics.html"
+    num_routes = 10
+
+    def dispatch(self, request, *args, **kwargs):
+        if not request.user.is_staff:
+            raise PermissionDenied
+        return super().dispatch(request, *args, **kwargs)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        routes = analytics.get_route_totals()
+        context["route_tables"] = [
+            (
+                "Most profitable routes",
+                routes.order_by("-average_profit", "origin", "destination")[
+                    : self.num_routes
+                ],
+            ),
+            (
+                "Least profitable routes",
+                routes.order_by("average_profit", "origin", "destination")[
+                    : self.num_routes
+                ],
+            ),
+        ]
+        context["aircraft_totals"] = analytics.get_aircraft_totals().order_by(
+            "-average_profit", "aircraft"
+        )
+        return context
+
+
+class MetricsView(View):
+    """Request timings and query counts per view, recorded by this process."""
+
+    def dispatch(self, request, *args, **kwargs):
+        if not request.user.is_staff:
+            raise PermissionDenied
+        return super().dispatch(request, *args, **kwargs)
+
+    def get(self, request):
+        return JsonResponse({"success": True, "views": instrumentation.snapshot()})
+
+    def post(self, request):
+        """Clear the recorded metrics."""
+        instrumentation.reset()
+        return JsonResponse({"success": True})